@@ -0,0 +1,64 @@
+"""Настройки общего для всех процессов кэша.
+
+Адрес кэша задаётся переменной окружения YATUBE_CACHE_URL:
+
+- ``redis://host:6379/0`` — Redis (нужен пакет django-redis);
+- ``file:///var/tmp/yatube-cache`` — файловый кэш в каталоге;
+- ``locmem://`` — кэш в памяти процесса, у каждого воркера свой.
+
+Если для Redis нет django-redis, используется файловый кэш: он тоже
+общий для всех воркеров на одной машине.
+"""
+import importlib.util
+import warnings
+from urllib.parse import urlsplit
+
+# Бэкенды Django с подсчётом попаданий для метрик (core.metrics).
+REDIS_BACKEND = 'core.cache_backends.RedisCache'
+FILE_BACKEND = 'core.cache_backends.FileBasedCache'
+LOCMEM_BACKEND = 'core.cache_backends.LocMemCache'
+REDIS_KVSTORE = 'sorl.thumbnail.kvstores.redis_kvstore.KVStore'
+CACHED_DB_KVSTORE = 'sorl.thumbnail.kvstores.cached_db_kvstore.KVStore'
+
+
+def has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def file_cache(location):
+    return {
+        'BACKEND': FILE_BACKEND,
+        'LOCATION': location,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+
+
+def cache_config(url, fallback_location):
+    """Словарь для settings.CACHES['default'] по адресу кэша."""
+    if not url:
+        return file_cache(fallback_location)
+    parts = urlsplit(url)
+    if parts.scheme in ('redis', 'rediss'):
+        if has_module('django_redis'):
+            return {'BACKEND': REDIS_BACKEND, 'LOCATION': url}
+        warnings.warn(
+            'Для Redis-кэша нужен пакет django-redis, '
+            f'используется файловый кэш в {fallback_location}'
+        )
+        return file_cache(fallback_location)
+    if parts.scheme == 'file':
+        return file_cache(parts.netloc + parts.path or fallback_location)
+    if parts.scheme == 'locmem':
+        return {'BACKEND': LOCMEM_BACKEND, 'LOCATION': parts.netloc}
+    raise ValueError(f'Неизвестная схема адреса кэша: {url}')
+
+
+def thumbnail_kvstore(url):
+    """Хранилище sorl-thumbnail для того же адреса кэша.
+
+    Для Redis (при установленном пакете redis) sorl пишет в него
+    напрямую, иначе — cached_db поверх общего кэша.
+    """
+    if urlsplit(url).scheme in ('redis', 'rediss') and has_module('redis'):
+        return REDIS_KVSTORE
+    return CACHED_DB_KVSTORE
@@ -0,0 +1,47 @@
+"""Бэкенды кэша Django, которые считают попадания и промахи."""
+import contextvars
+
+from django.core.cache.backends.filebased import FileBasedCache as _FileCache
+from django.core.cache.backends.locmem import LocMemCache as _LocMemCache
+
+from . import metrics
+
+_MISSING = object()
+# get_many у части бэкендов вызывает get: не считаем ключи дважды.
+_in_get_many = contextvars.ContextVar('in_get_many', default=False)
+
+
+class MetricsMixin:
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _MISSING, version, **kwargs)
+        if not _in_get_many.get():
+            metrics.incr('cache_misses' if value is _MISSING else 'cache_hits')
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        token = _in_get_many.set(True)
+        try:
+            found = super().get_many(keys, version, **kwargs)
+        finally:
+            _in_get_many.reset(token)
+        metrics.incr('cache_hits', len(found))
+        metrics.incr('cache_misses', len(keys) - len(found))
+        return found
+
+
+class FileBasedCache(MetricsMixin, _FileCache):
+    pass
+
+
+class LocMemCache(MetricsMixin, _LocMemCache):
+    pass
+
+
+try:
+    from django_redis.cache import RedisCache as _RedisCache
+except ImportError:
+    pass
+else:
+    class RedisCache(MetricsMixin, _RedisCache):
+        pass
@@ -0,0 +1,79 @@
+import multiprocessing
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.cache import LOCMEM_BACKEND, file_cache
+
+BENCH_TIMEOUT = 300
+
+
+def simulate_worker(alias, prefix, requests, keys, seed):
+    """Воркер, который отдаёт страницы лент через кэш alias.
+
+    Популярность страниц неравномерна (первые страницы лент
+    запрашиваются чаще), как у реального трафика.
+    """
+    cache = caches[alias]
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    hits = 0
+    for key in rng.choices(range(keys), weights, k=requests):
+        if cache.get(f'{prefix}:{key}') is not None:
+            hits += 1
+        else:
+            cache.set(f'{prefix}:{key}', b'x' * 1024, BENCH_TIMEOUT)
+    return hits
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает долю попаданий в кэш у N процессов-воркеров '
+        'для кэша в памяти процесса и общего кэша.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--keys', type=int, default=500)
+
+    def run(self, alias, workers, requests, keys):
+        # Свой префикс на каждый прогон: рабочий кэш не очищается.
+        prefix = f'bench:{time.time_ns()}'
+        context = multiprocessing.get_context('fork')
+        started = time.perf_counter()
+        with context.Pool(workers) as pool:
+            hits = pool.starmap(simulate_worker, [
+                (alias, prefix, requests, keys, seed)
+                for seed in range(workers)
+            ])
+        elapsed = time.perf_counter() - started
+        total = workers * requests
+        self.stdout.write(
+            f'{alias:>8}: попаданий {sum(hits) / total:6.1%}, '
+            f'{total / elapsed:8.0f} запросов/с'
+        )
+
+    def handle(self, *args, workers, requests, keys, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            bench_caches = {
+                'locmem': {'BACKEND': LOCMEM_BACKEND, 'LOCATION': 'bench'},
+                'file': file_cache(directory),
+                'default': settings.CACHES['default'],
+            }
+            with override_settings(CACHES=bench_caches):
+                self.stdout.write(
+                    f'Воркеров: {workers}, запросов на воркер: {requests}, '
+                    f'страниц: {keys}'
+                )
+                for alias in bench_caches:
+                    try:
+                        self.run(alias, workers, requests, keys)
+                    except InvalidCacheBackendError as error:
+                        self.stderr.write(f'{alias}: {error}')
@@ -0,0 +1,40 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик '
+        '(для локальной проверки чтения с реплик).'
+    )
+
+    def handle(self, *args, **options):
+        aliases = settings.REPLICA_DATABASES
+        if not aliases:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_DB_REPLICAS'
+            )
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError(
+                'Копировать можно только SQLite; реплики других СУБД '
+                'обновляет их собственная репликация'
+            )
+        primary.ensure_connection()
+        for alias in aliases:
+            # Открытое соединение с репликой увидело бы старый файл.
+            connections[alias].close()
+            started = time.perf_counter()
+            target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(
+                f'{alias}: {time.perf_counter() - started:.2f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
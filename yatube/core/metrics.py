@@ -0,0 +1,138 @@
+"""Метрики запросов: счётчики текущего запроса и гистограммы по view.
+
+MetricsMiddleware начинает сбор в начале запроса, а код приложения
+добавляет значения через incr() и timer(); вне запроса (например, в
+фоновом потоке) они ничего не делают. Итоги запроса попадают в
+заголовок Server-Timing, в лог core.metrics и в гистограммы, которые
+копятся в процессе и раз в METRICS_FLUSH_INTERVAL секунд сбрасываются
+в общий кэш, чтобы страница метрик видела все воркеры.
+
+Сброс прибавляет счётчики через cache.incr, а он атомарен между
+процессами только в Redis. В файловом кэше incr — это get и set, и при
+одновременном сбросе двух воркеров часть запросов может потеряться:
+гистограммы там приблизительные.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+REGISTRY_KEY = 'metrics:registry'
+BUCKET_KEY = 'metrics:{view}:{metric}:{bucket}'
+
+# Верхние границы корзин гистограмм; последняя — «больше».
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BUCKETS = {
+    'total_ms': MS_BUCKETS,
+    'sql_ms': MS_BUCKETS,
+    'template_ms': MS_BUCKETS,
+    'sql_count': COUNT_BUCKETS,
+    'cache_hits': COUNT_BUCKETS,
+    'cache_misses': COUNT_BUCKETS,
+    # Картинки, поставленные запросом в очередь миниатюр.
+    'thumbnails': COUNT_BUCKETS,
+}
+
+_current = contextvars.ContextVar('metrics', default=None)
+
+
+def start():
+    """Начинает сбор метрик текущего запроса."""
+    return _current.set(Counter())
+
+
+def finish(token):
+    """Заканчивает сбор и возвращает собранные значения."""
+    values = _current.get()
+    _current.reset(token)
+    return values
+
+
+def incr(name, value=1):
+    values = _current.get()
+    if values is not None:
+        values[name] += value
+
+
+@contextmanager
+def timer(name):
+    """Прибавляет к метрике name время блока в миллисекундах."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        incr(name, (time.perf_counter() - started) * 1000)
+
+
+def bucket(metric, value):
+    for bound in BUCKETS[metric]:
+        if value <= bound:
+            return str(bound)
+    return 'inf'
+
+
+class Histograms:
+    """Счётчики корзин, которые копятся локально и сбрасываются в кэш."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+
+    def record(self, view, values):
+        with self._lock:
+            for metric in BUCKETS:
+                key = (view, metric, bucket(metric, values.get(metric, 0)))
+                self._pending[key] += 1
+            due = (
+                time.monotonic() - self._flushed_at
+                >= settings.METRICS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        for (view, metric, bound), count in pending.items():
+            key = BUCKET_KEY.format(view=view, metric=metric, bucket=bound)
+            if not cache.add(key, count, None):
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    cache.set(key, count, None)
+        views = {view for view, _, _ in pending}
+        registry = cache.get(REGISTRY_KEY) or set()
+        if not views <= registry:
+            cache.set(REGISTRY_KEY, registry | views, None)
+
+    def read(self):
+        """view -> метрика -> [(граница корзины, число запросов)]."""
+        self.flush()
+        views = sorted(cache.get(REGISTRY_KEY) or ())
+        keys = {
+            (view, metric, bound): BUCKET_KEY.format(
+                view=view, metric=metric, bucket=bound
+            )
+            for view in views
+            for metric, bounds in BUCKETS.items()
+            for bound in [str(bound) for bound in bounds] + ['inf']
+        }
+        found = cache.get_many(keys.values())
+        result = defaultdict(dict)
+        for (view, metric, bound), key in keys.items():
+            result[view].setdefault(metric, []).append(
+                (bound, found.get(key, 0))
+            )
+        return dict(result)
+
+
+histograms = Histograms()
@@ -0,0 +1,104 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import metrics, replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+logger = logging.getLogger('core.metrics')
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    metrics.incr('sql_count')
+    with metrics.timer('sql_ms'):
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса и отдаёт их в Server-Timing и лог.
+
+    Работает без DEBUG: SQL считается через execute_wrapper, шаблоны и
+    кэш — через core.template_backends и core.cache_backends.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = metrics.start()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_sql_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            values = metrics.finish(token)
+        values['total_ms'] = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(values)
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            **{
+                metric: round(values.get(metric, 0), 2)
+                for metric in metrics.BUCKETS
+            },
+        }))
+        metrics.histograms.record(view, values)
+        return response
+
+    def server_timing(self, values):
+        return ', '.join([
+            'sql;dur={:.1f};desc="{} queries"'.format(
+                values['sql_ms'], values['sql_count']
+            ),
+            'tpl;dur={:.1f}'.format(values['template_ms']),
+            'cache;desc="hits={} misses={}"'.format(
+                values['cache_hits'], values['cache_misses']
+            ),
+            'thumb;desc="{}"'.format(values['thumbnails']),
+            'total;dur={:.1f}'.format(values['total_ms']),
+        ])
+
+
+class ReplicaMiddleware:
+    """Выбирает базу для чтений запроса (см. core.replicas).
+
+    Безопасные запросы читают с одной случайной реплики, если у
+    пользователя нет куки недавней записи; после остальных запросов и
+    безопасных, отмеченных replicas.pin_to_primary, кука ставится на
+    REPLICA_PIN_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        aliases = settings.REPLICA_DATABASES
+        alias = DEFAULT_DB_ALIAS
+        safe = request.method in SAFE_METHODS
+        if aliases and safe and replicas.PIN_COOKIE not in request.COOKIES:
+            alias = random.choice(aliases)
+        with replicas.read_from(alias):
+            response = self.get_response(request)
+        wrote = not safe or getattr(request, 'wrote_to_primary', False)
+        if aliases and wrote:
+            response.set_cookie(
+                replicas.PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
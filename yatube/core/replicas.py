@@ -0,0 +1,83 @@
+"""Чтение с реплик базы данных.
+
+Реплики задаются переменной окружения YATUBE_DB_REPLICAS: имена баз
+(для SQLite — пути к файлам) через запятую. Они подключаются с теми же
+настройками, что и default, под псевдонимами replica1, replica2, …;
+список псевдонимов — settings.REPLICA_DATABASES. Локальные файлы SQLite
+обновляются копией основной базы: manage.py sync_replicas.
+
+ReplicaRouter отправляет на реплику только чтения внутри безопасных
+(GET, HEAD, OPTIONS) запросов; реплику выбирает ReplicaMiddleware
+один раз на запрос. Запись, остальные запросы, команды и фоновые потоки
+работают с default. После записи пользователь ещё REPLICA_PIN_SECONDS
+читает с default (кука PIN_COOKIE), чтобы видеть свои изменения, даже
+если реплики отстают. Представления, которые пишут в базу по
+безопасному запросу (подписка по ссылке), вызывают pin_to_primary.
+
+Отставание реплик ничем не ограничено (sync_replicas копирует базу
+вручную), поэтому кэш лент и ETag при чтении с реплики берут
+поколения из LastModified той же реплики, а не из общего кэша (см.
+posts.feed_cache): страница с отставшей реплики не попадает под ключ
+и ETag свежих данных. Свои изменения пользователь гарантированно видит
+только REPLICA_PIN_SECONDS после записи.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'read_primary'
+ALIAS_PREFIX = 'replica'
+
+_read_alias = contextvars.ContextVar('read_alias', default=DEFAULT_DB_ALIAS)
+
+
+def replica_databases(names, primary):
+    """Словарь для DATABASES: реплики из строки имён через запятую."""
+    names = [name.strip() for name in names.split(',') if name.strip()]
+    return {
+        f'{ALIAS_PREFIX}{number}': {
+            **primary,
+            'NAME': name,
+            # В тестах реплика — та же тестовая база.
+            'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+        }
+        for number, name in enumerate(names, 1)
+    }
+
+
+@contextmanager
+def read_from(alias):
+    """Направляет чтения в блоке на базу alias."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_to_primary(request):
+    """Отмечает запись в безопасном запросе: остаток запроса читает с
+    default, а ReplicaMiddleware ставит куку PIN_COOKIE."""
+    request.wrote_to_primary = True
+    _read_alias.set(DEFAULT_DB_ALIAS)
+
+
+def read_alias():
+    """База, с которой читает текущий запрос."""
+    return _read_alias.get()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Все базы — копии одной.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
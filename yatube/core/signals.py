@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .sqlite import apply_pragmas
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    # Прагмы базы в памяти (тесты) не нужны, а WAL ей недоступен.
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    apply_pragmas(connection, settings.SQLITE_PRAGMAS)
@@ -0,0 +1,53 @@
+"""Профили настроек SQLite.
+
+Профиль задаётся переменной окружения YATUBE_DB_PROFILE:
+
+- ``development`` (по умолчанию) — настройки Django: журнал DELETE,
+  соединение на запрос, ожидание блокировки 5 секунд;
+- ``production`` — журнал WAL (читатели не ждут писателя, а писатель —
+  читателей), прагмы кэша и mmap, соединения живут между запросами,
+  а занятая база ждётся дольше, вместо ошибки «database is locked».
+
+Прагмы выполняются для каждого нового соединения (core.signals).
+"""
+DEVELOPMENT = 'development'
+PRODUCTION = 'production'
+
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # В WAL при сбое процесса данные не теряются, fsync — только на
+    # контрольных точках.
+    'synchronous': 'NORMAL',
+    # Отрицательное значение — в килобайтах: 64 МБ на соединение.
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+PROFILES = {
+    DEVELOPMENT: ({}, {}),
+    PRODUCTION: (
+        {
+            'CONN_MAX_AGE': 600,
+            # Секунды ожидания блокировки (busy timeout) в sqlite3.
+            'OPTIONS': {'timeout': 20},
+        },
+        PRODUCTION_PRAGMAS,
+    ),
+}
+
+
+def sqlite_profile(name):
+    """(дополнение к DATABASES['default'], прагмы) профиля name."""
+    if name not in PROFILES:
+        raise ValueError(
+            f'Неизвестный профиль базы {name!r}, есть: {", ".join(PROFILES)}'
+        )
+    database, pragmas = PROFILES[name]
+    return dict(database), dict(pragmas)
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет прагмы на открытом соединении Django с SQLite."""
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,191 @@
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core.cache import (CACHED_DB_KVSTORE, FILE_BACKEND, LOCMEM_BACKEND,
+                        REDIS_BACKEND, REDIS_KVSTORE, cache_config,
+                        thumbnail_kvstore)
+from core import metrics, replicas
+from core.sqlite import PRODUCTION_PRAGMAS, sqlite_profile
+from core.middleware import ReplicaMiddleware
+
+FALLBACK = '/tmp/yatube-cache'
+
+
+class CacheConfigTest(SimpleTestCase):
+    def test_default_is_shared_file_cache(self):
+        """Без адреса используется файловый кэш, общий для воркеров."""
+        config = cache_config('', FALLBACK)
+        self.assertEqual(config['BACKEND'], FILE_BACKEND)
+        self.assertEqual(config['LOCATION'], FALLBACK)
+
+    def test_url_schemes(self):
+        """Адреса file:// и locmem:// разбираются в нужный бэкенд."""
+        self.assertEqual(
+            cache_config('file:///var/tmp/cache', FALLBACK)['LOCATION'],
+            '/var/tmp/cache'
+        )
+        self.assertEqual(
+            cache_config('locmem://', FALLBACK)['BACKEND'], LOCMEM_BACKEND
+        )
+        with self.assertRaises(ValueError):
+            cache_config('memcached://localhost', FALLBACK)
+
+    def test_redis_with_and_without_client(self):
+        """Redis используется при наличии клиента, иначе — файловый кэш."""
+        url = 'redis://localhost:6379/1'
+        with mock.patch('core.cache.has_module', return_value=True):
+            self.assertEqual(
+                cache_config(url, FALLBACK),
+                {'BACKEND': REDIS_BACKEND, 'LOCATION': url}
+            )
+            self.assertEqual(thumbnail_kvstore(url), REDIS_KVSTORE)
+        with mock.patch('core.cache.has_module', return_value=False):
+            with self.assertWarns(UserWarning):
+                config = cache_config(url, FALLBACK)
+            self.assertEqual(config['BACKEND'], FILE_BACKEND)
+            self.assertEqual(thumbnail_kvstore(url), CACHED_DB_KVSTORE)
+
+
+@override_settings(METRICS_FLUSH_INTERVAL=0)
+class MetricsTest(TestCase):
+    def setUp(self):
+        # Записи запросов из других тестов ещё не сброшены в кэш.
+        metrics.histograms.flush()
+        cache.clear()
+
+    def server_timing(self, response):
+        header = response['Server-Timing']
+        return {
+            name: int(value)
+            for name, value in re.findall(r'(\w+)=(\d+)', header)
+        }
+
+    def test_server_timing_header(self):
+        """Заголовок Server-Timing с SQL, шаблонами и кэшем."""
+        first = self.client.get(reverse('posts:index'))
+        self.assertRegex(
+            first['Server-Timing'], r'sql;dur=[\d.]+;desc="\d+ queries"'
+        )
+        self.assertIn('tpl;dur=', first['Server-Timing'])
+        self.assertGreater(self.server_timing(first)['misses'], 0)
+        second = self.client.get(reverse('posts:index'))
+        self.assertGreater(self.server_timing(second)['hits'], 0)
+
+    def test_incr_outside_request_is_ignored(self):
+        """Вне запроса счётчики ничего не делают."""
+        metrics.incr('sql_count')
+        token = metrics.start()
+        metrics.incr('sql_count', 2)
+        self.assertEqual(metrics.finish(token)['sql_count'], 2)
+
+    def test_histograms_are_staff_only(self):
+        """Гистограммы видит только персонал."""
+        url = reverse('metrics')
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = get_user_model().objects.create_user(
+            'staff', is_staff=True
+        )
+        self.client.force_login(staff)
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        total = dict(response.json()['posts:index']['total_ms'])
+        self.assertEqual(sum(total.values()), 1)
+
+
+class ReplicaTest(SimpleTestCase):
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_replica_databases(self):
+        """Реплики из окружения повторяют настройки основной базы."""
+        primary = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db'}
+        databases = replicas.replica_databases(' r1.sqlite3, ,r2 ', primary)
+        self.assertEqual(list(databases), ['replica1', 'replica2'])
+        self.assertEqual(databases['replica2']['NAME'], 'r2')
+        self.assertEqual(
+            databases['replica1']['TEST'], {'MIRROR': DEFAULT_DB_ALIAS}
+        )
+        self.assertEqual(replicas.replica_databases('', primary), {})
+
+    def test_router(self):
+        """Вне запроса и при записи — основная база."""
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+        with replicas.read_from('replica1'):
+            self.assertEqual(self.router.db_for_read(None), 'replica1')
+            self.assertEqual(self.router.db_for_write(None), DEFAULT_DB_ALIAS)
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    @override_settings(REPLICA_DATABASES=['replica1'],
+                       REPLICA_PIN_SECONDS=30)
+    def test_middleware_pins_writer_to_primary(self):
+        """После POST пользователь читает с основной базы по куке."""
+        used = []
+
+        def view(request):
+            used.append(self.router.db_for_read(None))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        response = middleware(self.factory.get('/'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+        response = middleware(self.factory.post('/create/'))
+        self.assertEqual(
+            response.cookies[replicas.PIN_COOKIE]['max-age'], 30
+        )
+        pinned = self.factory.get('/')
+        pinned.COOKIES[replicas.PIN_COOKIE] = '1'
+        middleware(pinned)
+        self.assertEqual(
+            used, ['replica1', DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS]
+        )
+
+    def test_middleware_without_replicas(self):
+        response = ReplicaMiddleware(lambda request: HttpResponse())(
+            self.factory.post('/create/')
+        )
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+
+class SQLiteProfileTest(SimpleTestCase):
+    def test_profiles(self):
+        """production: WAL, долгие соединения и ожидание блокировки."""
+        self.assertEqual(sqlite_profile('development'), ({}, {}))
+        database, pragmas = sqlite_profile('production')
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+        self.assertGreater(database['CONN_MAX_AGE'], 0)
+        self.assertGreater(database['OPTIONS']['timeout'], 5)
+        with self.assertRaises(ValueError):
+            sqlite_profile('fast')
+
+    def test_pragmas_applied_on_connect(self):
+        """Прагмы выполняются для каждого нового соединения с файлом."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        wrapper = DatabaseWrapper(dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory, 'db.sqlite3'),
+        ))
+        self.addCleanup(wrapper.close)
+        with override_settings(SQLITE_PRAGMAS=PRODUCTION_PRAGMAS):
+            wrapper.ensure_connection()
+        pragmas = {
+            name: wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+            for name in ('journal_mode', 'synchronous', 'cache_size')
+        }
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -64000,
+        })
@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +19,12 @@ def permission_denied(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def metrics_histograms(request):
+    """Гистограммы метрик запросов по view, только для персонала."""
+    histograms = metrics.histograms.read()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(histograms)
+    return render(request, 'core/metrics.html', {'histograms': histograms})
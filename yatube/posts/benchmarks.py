@@ -0,0 +1,224 @@
+"""Замеры запросов, времени и памяти страниц posts.
+
+seed() заполняет базу синтетическими данными, measure() проходит по
+сценариям и для каждого возвращает число SQL-запросов, p50/p95
+времени ответа и пик выделенной памяти, compare() сравнивает результат
+с сохранёнными базовыми значениями (см. manage.py bench_views).
+"""
+import random
+import statistics
+import time
+import tracemalloc
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from .bulk import BATCH_SIZE
+from .models import Comment, Follow, Group, Post, User
+
+BENCH_IMAGE = 'posts/bench.jpg'
+BENCH_IMAGE_SIZE = (1200, 800)
+BENCH_IMAGE_FIELDS = {
+    'image': BENCH_IMAGE,
+    'image_width': BENCH_IMAGE_SIZE[0],
+    'image_height': BENCH_IMAGE_SIZE[1],
+}
+# Метрики результата и допустим ли для них порог (время и память
+# шумят, число запросов сравнивается точно).
+METRICS = {
+    'queries': False,
+    'p50_ms': True,
+    'p95_ms': True,
+    'peak_kb': True,
+}
+
+
+def seed(users=200, groups=20, posts=5000, comments=5000, follows=2000,
+         random_seed=0):
+    """Заполняет базу синтетическими данными.
+
+    Посты, комментарии и подписки создаются через bulk_create, без
+    сигналов, поэтому счётчики, ленты подписок, поисковый индекс и
+    время изменения лент потом пересобираются целиком.
+    """
+    rng = random.Random(random_seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    authors = mixer.cycle(users).blend(
+        User,
+        username=mixer.sequence('bench_{0}'),
+        first_name=fake.first_name,
+        last_name=fake.last_name,
+    )
+    all_groups = mixer.cycle(groups).blend(
+        Group, slug=mixer.sequence('bench-{0}'), title=fake.word
+    )
+
+    if not default_storage.exists(BENCH_IMAGE):
+        content = BytesIO()
+        Image.new('RGB', BENCH_IMAGE_SIZE, (120, 160, 200)).save(
+            content, 'JPEG'
+        )
+        default_storage.save(BENCH_IMAGE, ContentFile(content.getvalue()))
+    Post.objects.bulk_create((
+        Post(
+            text=fake.text(max_nb_chars=400),
+            author=rng.choice(authors),
+            group=rng.choice(all_groups + [None]),
+            **(BENCH_IMAGE_FIELDS if rng.random() < 0.3 else {}),
+        )
+        for _ in range(posts)
+    ), batch_size=BATCH_SIZE)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    Comment.objects.bulk_create((
+        Comment(
+            post_id=rng.choice(post_ids),
+            author=rng.choice(authors),
+            text=fake.sentence(),
+        )
+        for _ in range(comments)
+    ), batch_size=BATCH_SIZE)
+    pairs = set()
+    while len(pairs) < min(follows, users * (users - 1)):
+        user, author = rng.sample(authors, 2)
+        pairs.add((user.pk, author.pk))
+    Follow.objects.bulk_create((
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in pairs
+    ), batch_size=BATCH_SIZE)
+    for command in (
+        'rebuild_user_stats', 'rebuild_timelines', 'rebuild_search_index',
+        'rebuild_last_modified',
+    ):
+        call_command(command, stdout=StringIO())
+
+
+def scenarios():
+    """Сценарий -> (метод, адрес, данные запроса по номеру)."""
+    reader = User.objects.annotate(
+        follows=Count('follower')
+    ).order_by('-follows', 'pk').first()
+    group = Group.objects.annotate(
+        size=Count('posts')
+    ).order_by('-size', 'pk').first()
+    author = User.objects.annotate(
+        size=Count('posts')
+    ).order_by('-size', 'pk').first()
+    post = Post.objects.annotate(
+        size=Count('comments')
+    ).order_by('-size', 'pk').first()
+    star = User.objects.annotate(
+        size=Count('following')
+    ).order_by('-size', 'pk').first()
+    return reader, {
+        'index': ('get', reverse('posts:index'), None),
+        'group_posts': (
+            'get', reverse('posts:group_list', args=[group.slug]), None
+        ),
+        'profile': (
+            'get', reverse('posts:profile', args=[author.username]), None
+        ),
+        'post_detail': (
+            'get', reverse('posts:post_detail', args=[post.pk]), None
+        ),
+        'follow_index': ('get', reverse('posts:follow_index'), None),
+        'followers': (
+            'get', reverse('posts:followers', args=[star.username]), None
+        ),
+        'index_feed': (
+            'get', reverse('posts:index_feed', args=['json']), None
+        ),
+        'post_create': (
+            'post', reverse('posts:post_create'),
+            lambda number: {'text': f'Замер {number}'},
+        ),
+        'add_comment': (
+            'post', reverse('posts:add_comment', args=[post.pk]),
+            lambda number: {'text': f'Комментарий {number}'},
+        ),
+    }
+
+
+def _request(client, method, address, data, number):
+    # Замеряется отрисовка без кэша лент.
+    cache.clear()
+    if data is None:
+        response = getattr(client, method)(address)
+    else:
+        response = getattr(client, method)(address, data(number))
+    if response.streaming:
+        # Тело потоковых ответов собирается при чтении.
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(requests=20, names=None):
+    """Прогоняет сценарии и возвращает метрики каждого."""
+    reader, all_scenarios = scenarios()
+    client = Client()
+    client.force_login(reader)
+    results = {}
+    for name, (method, address, data) in all_scenarios.items():
+        if names and name not in names:
+            continue
+        _request(client, method, address, data, 0)
+        queries = 0
+        timings = []
+        for number in range(1, requests + 1):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                _request(client, method, address, data, number)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured))
+        # Память отдельным проходом: tracemalloc замедляет запросы.
+        tracemalloc.start()
+        try:
+            peaks = []
+            for number in range(requests + 1, requests + 4):
+                tracemalloc.reset_peak()
+                _request(client, method, address, data, number)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        quantiles = statistics.quantiles(timings, n=20, method='inclusive')
+        results[name] = {
+            'queries': queries,
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(quantiles[18], 2),
+            'peak_kb': round(max(peaks) / 1024, 1),
+        }
+    return results
+
+
+def compare(results, baselines, threshold):
+    """Регрессии относительно baselines: список сообщений.
+
+    Число запросов не должно вырасти совсем, время и память — больше
+    чем на долю threshold.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        for metric, noisy in METRICS.items():
+            if metric not in baseline:
+                continue
+            limit = baseline[metric] * (1 + threshold if noisy else 1)
+            if metrics[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {metrics[metric]} > {limit:g} '
+                    f'(база {baseline[metric]})'
+                )
+    return regressions
@@ -0,0 +1,15 @@
+"""Общее для массовой обработки строк пачками."""
+from itertools import islice
+
+# Больше 500 строк в одном INSERT SQLite не принимает.
+BATCH_SIZE = 500
+
+
+def batches(iterable, size):
+    """Списки по size элементов iterable; последний может быть короче."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
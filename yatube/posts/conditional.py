@@ -0,0 +1,193 @@
+"""ETag и Last-Modified для условных GET-запросов к лентам и постам.
+
+Функции вызываются декоратором condition до view и обходятся
+дешёвыми запросами: поколениями кэша лент (их увеличивают сигналы при
+любом изменении ленты, см. feed_cache) и временем изменения тех же
+областей из LastModified.
+Если браузер прислал тот же ETag, view не выполняется и страница не
+отрисовывается, а ответ — 304.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+
+from . import feed_cache
+from .models import Comment, Follow, Group, LastModified, Post, User
+
+
+def _hash(*parts):
+    raw = ':'.join(map(str, parts))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _etag(request, *parts):
+    # Страницы зависят от пользователя (шапка, подписка, формы) и от
+    # параметров страницы.
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    return _hash(user_id, request.GET.urlencode(), *parts)
+
+
+def _feed_etag(request, fmt, *scopes):
+    # Ленты для агрегаторов одинаковы для всех пользователей.
+    return _hash(
+        fmt, request.GET.urlencode(), *feed_cache.generations(*scopes)
+    )
+
+
+def _lookup(request, name, queryset):
+    # id из адреса нужен и для ETag, и для Last-Modified: запоминаем
+    # его на запросе, чтобы не ходить в базу дважды.
+    cached = request.__dict__.setdefault('_conditional', {})
+    if name not in cached:
+        cached[name] = queryset.values_list('pk', flat=True).first()
+    return cached[name]
+
+
+def _group_id(request, slug):
+    return _lookup(request, 'group', Group.objects.filter(slug=slug))
+
+
+def _author_id(request, username):
+    return _lookup(request, 'author', User.objects.filter(username=username))
+
+
+def index_etag(request):
+    return _etag(
+        request, *feed_cache.generations(feed_cache.POSTS, feed_cache.GROUPS)
+    )
+
+
+def index_last_modified(request):
+    return LastModified.objects.latest_for(
+        feed_cache.POSTS, feed_cache.GROUPS
+    )
+
+
+def group_etag(request, slug):
+    group_id = _group_id(request, slug)
+    if group_id is None:
+        return None
+    return _etag(request, *feed_cache.generations(
+        feed_cache.group_scope(group_id), feed_cache.GROUPS
+    ))
+
+
+def group_last_modified(request, slug):
+    group_id = _group_id(request, slug)
+    if group_id is None:
+        return None
+    return LastModified.objects.latest_for(
+        feed_cache.group_scope(group_id), feed_cache.GROUPS
+    )
+
+
+def profile_etag(request, username):
+    author_id = _author_id(request, username)
+    if author_id is None:
+        return None
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author_id=author_id
+    ).exists()
+    return _etag(request, following, *feed_cache.generations(
+        feed_cache.author_scope(author_id), feed_cache.GROUPS,
+        feed_cache.follows_scope(author_id),
+    ))
+
+
+def profile_last_modified(request, username):
+    author_id = _author_id(request, username)
+    if author_id is None:
+        return None
+    return LastModified.objects.latest_for(
+        feed_cache.author_scope(author_id), feed_cache.GROUPS,
+        feed_cache.follows_scope(author_id),
+    )
+
+
+def follows_etag(request, username):
+    user_id = _author_id(request, username)
+    if user_id is None:
+        return None
+    return _etag(
+        request, *feed_cache.generations(feed_cache.follows_scope(user_id))
+    )
+
+
+def follows_last_modified(request, username):
+    user_id = _author_id(request, username)
+    if user_id is None:
+        return None
+    return LastModified.objects.latest_for(feed_cache.follows_scope(user_id))
+
+
+def index_feed_etag(request, fmt):
+    return _feed_etag(request, fmt, feed_cache.POSTS, feed_cache.GROUPS)
+
+
+def index_feed_last_modified(request, fmt):
+    return index_last_modified(request)
+
+
+def group_feed_etag(request, slug, fmt):
+    group_id = _group_id(request, slug)
+    if group_id is None:
+        return None
+    return _feed_etag(
+        request, fmt, feed_cache.group_scope(group_id), feed_cache.GROUPS
+    )
+
+
+def group_feed_last_modified(request, slug, fmt):
+    return group_last_modified(request, slug)
+
+
+def profile_feed_etag(request, username, fmt):
+    author_id = _author_id(request, username)
+    if author_id is None:
+        return None
+    return _feed_etag(
+        request, fmt, feed_cache.author_scope(author_id), feed_cache.GROUPS
+    )
+
+
+def profile_feed_last_modified(request, username, fmt):
+    # Без подписок: в ленте их нет.
+    author_id = _author_id(request, username)
+    if author_id is None:
+        return None
+    return LastModified.objects.latest_for(
+        feed_cache.author_scope(author_id), feed_cache.GROUPS
+    )
+
+
+def _post(request, post_id):
+    # Как и _lookup, запоминает данные поста на запросе.
+    if not hasattr(request, '_conditional_post'):
+        post = Post.objects.filter(pk=post_id).values(
+            'author_id', 'updated_at'
+        ).first()
+        if post is not None:
+            post.update(Comment.objects.filter(post_id=post_id).aggregate(
+                comments=Count('pk'), commented=Max('created')
+            ))
+        request._conditional_post = post
+    return request._conditional_post
+
+
+def post_etag(request, post_id):
+    post = _post(request, post_id)
+    if post is None:
+        return None
+    return _etag(
+        request, post['comments'], post['commented'],
+        *feed_cache.generations(
+            feed_cache.author_scope(post['author_id']), feed_cache.GROUPS
+        ),
+    )
+
+
+def post_last_modified(request, post_id):
+    post = _post(request, post_id)
+    if post is None:
+        return None
+    return max(filter(None, [post['updated_at'], post['commented']]))
@@ -0,0 +1,103 @@
+"""Кэш страниц лент с поколениями вместо короткого TTL.
+
+Ключ страницы ленты состоит из её параметров и номеров поколений
+областей (scopes), от которых лента зависит. Сигналы моделей
+заменяют поколения затронутых областей новыми, и все старые ключи
+перестают использоваться сразу, поэтому TTL может быть длинным.
+
+Поколение — не счётчик, а новое значение времени в наносекундах:
+инкремент файлового кэша (get и set) не атомарен между процессами, и
+два одновременных bump могли бы оба записать N+1. Тогда страница,
+отрисованная между ними без второго изменения, жила бы в кэше под
+последним поколением весь FEED_CACHE_TIMEOUT.
+
+Запрос, который читает с реплики (core.replicas), берёт поколения не
+из кэша, а из LastModified той же реплики: данные страницы и её ключ
+отстают вместе, и страница со старыми данными не попадает под ключ
+новых. Ключи реплик не пересекаются с ключами основной базы.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from core import replicas
+
+from .models import LastModified
+
+GENERATION_KEY = 'feed-generation:{}'
+
+POSTS = 'posts'
+GROUPS = 'groups'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follows_scope(user_id):
+    """Подписчики и подписки пользователя: счётчики в профиле и
+    списки."""
+    return f'follows:{user_id}'
+
+
+def _new_generation():
+    # Не должно повторять уже использованный номер, в том числе после
+    # вытеснения из кэша.
+    return time.time_ns()
+
+
+def _replica_generations(alias, scopes):
+    # Роутер отправляет запрос на ту же реплику, что и остальные чтения.
+    modified = dict(LastModified.objects.filter(
+        scope__in=scopes
+    ).values_list('scope', 'modified'))
+    return [
+        f'{alias}@{modified[scope].timestamp() if scope in modified else 0}'
+        for scope in scopes
+    ]
+
+
+def generations(*scopes):
+    alias = replicas.read_alias()
+    if alias != DEFAULT_DB_ALIAS:
+        return _replica_generations(alias, scopes)
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    cache.set_many({
+        GENERATION_KEY.format(scope): _new_generation()
+        for scope in set(scopes)
+    }, None)
+
+
+def page_key(request, *scopes):
+    """Ключ страницы ленты: параметры страницы и поколения областей."""
+    parts = [
+        request.GET.get('page', ''),
+        request.GET.get('cursor', ''),
+        *(
+            f'{scope}={generation}'
+            for scope, generation in zip(scopes, generations(*scopes))
+        ),
+    ]
+    return ':'.join(parts)
+
+
+def page_context(request, *scopes):
+    return {
+        'feed_cache_key': page_key(request, *scopes),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,202 @@
+"""Ленты постов для агрегаторов: JSON Feed, RSS 2.0 и Atom.
+
+Посты выбираются через values() (без создания моделей) одной
+страницей курсорного вывода, а документ собирается генератором по
+записи и отдаётся StreamingHttpResponse, без шаблонизатора.
+"""
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.utils.text import Truncator
+
+FIELDS = (
+    'pk', 'text', 'pub_date', 'updated_at', 'image',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+TITLE_LENGTH = 60
+
+
+def project(posts):
+    """Только поля, которые попадают в ленту."""
+    return posts.values(*FIELDS)
+
+
+class Feed:
+    """Страница ленты с абсолютными адресами для сериализаторов."""
+
+    def __init__(self, request, page, title, link):
+        self.request = request
+        self.title = title
+        self.link = request.build_absolute_uri(link)
+        self.url = request.build_absolute_uri()
+        self.next_url = None
+        if page.next_cursor:
+            query = request.GET.copy()
+            query['cursor'] = page.next_cursor
+            self.next_url = request.build_absolute_uri(
+                f'?{query.urlencode()}'
+            )
+        self.rows = page.object_list
+
+    def updated(self):
+        return max(
+            (row['updated_at'] for row in self.rows),
+            default=timezone.now(),
+        )
+
+    def entries(self):
+        absolute = self.request.build_absolute_uri
+        for row in self.rows:
+            full_name = (
+                f'{row["author__first_name"]} {row["author__last_name"]}'
+            ).strip()
+            yield {
+                'url': absolute(
+                    reverse('posts:post_detail', args=[row['pk']])
+                ),
+                'title': Truncator(row['text']).chars(TITLE_LENGTH),
+                'text': row['text'],
+                'published': row['pub_date'],
+                'updated': row['updated_at'],
+                'author': full_name or row['author__username'],
+                'author_url': absolute(
+                    reverse('posts:profile', args=[row['author__username']])
+                ),
+                'group': row['group__title'],
+                'group_slug': row['group__slug'],
+                'image': (
+                    absolute(default_storage.url(row['image']))
+                    if row['image'] else None
+                ),
+            }
+
+
+def _tag(name, text, **attrs):
+    attributes = ''.join(
+        f' {key}={quoteattr(str(value))}' for key, value in attrs.items()
+    )
+    if text is None:
+        return f'<{name}{attributes}/>'
+    return f'<{name}{attributes}>{escape(str(text))}</{name}>'
+
+
+def json_feed(feed):
+    """JSON Feed 1.1 (https://jsonfeed.org/version/1.1)."""
+    head = {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': feed.title,
+        'home_page_url': feed.link,
+        'feed_url': feed.url,
+    }
+    if feed.next_url:
+        head['next_url'] = feed.next_url
+    yield json.dumps(head, ensure_ascii=False)[:-1] + ', "items": ['
+    for number, entry in enumerate(feed.entries()):
+        item = {
+            'id': entry['url'],
+            'url': entry['url'],
+            'title': entry['title'],
+            'content_text': entry['text'],
+            'date_published': rfc3339_date(entry['published']),
+            'date_modified': rfc3339_date(entry['updated']),
+            'authors': [{'name': entry['author'], 'url': entry['author_url']}],
+            'tags': [entry['group']] if entry['group'] else [],
+        }
+        if entry['image']:
+            item['image'] = entry['image']
+        separator = ', ' if number else ''
+        yield separator + json.dumps(item, ensure_ascii=False)
+    yield ']}'
+
+
+def rss(feed):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+    )
+    yield _tag('title', feed.title)
+    yield _tag('link', feed.link)
+    yield _tag('description', feed.title)
+    yield _tag('atom:link', None, href=feed.url, rel='self')
+    if feed.next_url:
+        yield _tag('atom:link', None, href=feed.next_url, rel='next')
+    yield _tag('lastBuildDate', rfc2822_date(feed.updated()))
+    for entry in feed.entries():
+        yield ''.join((
+            '<item>',
+            _tag('title', entry['title']),
+            _tag('link', entry['url']),
+            _tag('guid', entry['url'], isPermaLink='true'),
+            _tag('description', entry['text']),
+            _tag('pubDate', rfc2822_date(entry['published'])),
+            _tag('dc:creator', entry['author']),
+            _tag('category', entry['group']) if entry['group'] else '',
+            '</item>',
+        ))
+    yield '</channel></rss>'
+
+
+def atom(feed):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+    )
+    yield _tag('title', feed.title)
+    yield _tag('id', feed.url)
+    yield _tag('updated', rfc3339_date(feed.updated()))
+    yield _tag('link', None, href=feed.link, rel='alternate')
+    yield _tag('link', None, href=feed.url, rel='self')
+    if feed.next_url:
+        yield _tag('link', None, href=feed.next_url, rel='next')
+    for entry in feed.entries():
+        yield ''.join((
+            '<entry>',
+            _tag('title', entry['title']),
+            _tag('id', entry['url']),
+            _tag('link', None, href=entry['url'], rel='alternate'),
+            _tag('published', rfc3339_date(entry['published'])),
+            _tag('updated', rfc3339_date(entry['updated'])),
+            '<author>',
+            _tag('name', entry['author']),
+            _tag('uri', entry['author_url']),
+            '</author>',
+            _tag('category', None, term=entry['group_slug'],
+                 label=entry['group']) if entry['group'] else '',
+            _tag('content', entry['text'], type='text'),
+            '</entry>',
+        ))
+    yield '</feed>'
+
+
+# Формат -> (Content-Type, сериализатор).
+FORMATS = {
+    'json': ('application/feed+json; charset=utf-8', json_feed),
+    'rss': ('application/rss+xml; charset=utf-8', rss),
+    'atom': ('application/atom+xml; charset=utf-8', atom),
+}
+
+
+class FormatConverter:
+    """Конвертер адресов: формат ленты из FORMATS."""
+    regex = '|'.join(FORMATS)
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+def response(request, fmt, page, title, link):
+    content_type, serialize = FORMATS[fmt]
+    return StreamingHttpResponse(
+        serialize(Feed(request, page, title, link)),
+        content_type=content_type,
+    )
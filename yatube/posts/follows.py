@@ -0,0 +1,170 @@
+"""Подписки пачкой и рекомендации, на кого подписаться.
+
+follow_many и unfollow_many меняют подписки пользователя на несколько
+авторов одной транзакцией: один INSERT (или DELETE) подписок вместо
+запроса на автора. Сигналы при этом не вызываются, поэтому счётчики,
+ленты подписок и кэши обновляются здесь же, тоже пачкой. Подписки
+одного пользователя меняются по очереди (lock_follows, в том числе в
+follow и unfollow): иначе параллельная подписка между чтением подписок
+и вставкой была бы посчитана дважды.
+
+Рекомендации считаются заранее (manage.py rebuild_follow_suggestions)
+и хранятся в FollowSuggestion: кандидаты — авторы, на которых подписаны
+подписки пользователя, и те, кто комментирует те же посты. Вес — сумма
+путей через подписки и общих постов с весами MUTUAL_WEIGHT и
+SHARED_POST_WEIGHT.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, F
+
+from . import feed_cache, timeline
+from .bulk import BATCH_SIZE, batches
+from .models import (Comment, Follow, FollowSuggestion, LastModified,
+                     TimelineEntry, User, UserStats)
+
+MUTUAL_WEIGHT = 2
+SHARED_POST_WEIGHT = 1
+
+
+def touch_follows(*user_ids):
+    """Отмечает изменение подписчиков и подписок пользователей."""
+    scopes = [feed_cache.follows_scope(pk) for pk in user_ids]
+    feed_cache.bump(*scopes)
+    LastModified.objects.touch(*scopes)
+
+
+def lock_follows(user):
+    """Блокирует строку пользователя до конца транзакции. В SQLite
+    select_for_update ничего не делает: там пишет только одна
+    транзакция."""
+    User.objects.select_for_update().filter(pk=user.pk).values_list(
+        'pk', flat=True
+    ).get()
+
+
+def follow(user, author):
+    """Подписывает user на author; сигналы обновляют остальное."""
+    with transaction.atomic():
+        lock_follows(user)
+        Follow.objects.get_or_create(user=user, author=author)
+
+
+def unfollow(user, author):
+    with transaction.atomic():
+        lock_follows(user)
+        Follow.objects.filter(user=user, author=author).delete()
+
+
+def _delete_follows(user, author_ids):
+    """DELETE подписок одним запросом: QuerySet.delete() собрал бы
+    объекты и вызвал сигналы на каждую подписку."""
+    database = router.db_for_write(Follow)
+    connection = connections[database]
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    with connection.cursor() as cursor:
+        for batch in batches(author_ids, BATCH_SIZE):
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id = %s '
+                f'AND author_id IN ({placeholders})',
+                [user.pk, *batch],
+            )
+
+
+def follow_many(user, author_ids):
+    """Подписывает user на авторов; возвращает id новых подписок."""
+    author_ids = set(author_ids) - {user.pk}
+    with transaction.atomic():
+        lock_follows(user)
+        followed = set(Follow.objects.filter(
+            user=user, author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+        added = author_ids - followed
+        if not added:
+            return added
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=pk) for pk in added],
+            batch_size=BATCH_SIZE,
+        )
+        UserStats.objects.add_many(added, followers_count=1)
+        UserStats.objects.add(user.pk, following_count=len(added))
+        timeline.backfill_many(user.pk, added)
+        FollowSuggestion.objects.filter(
+            user=user, suggested_id__in=added
+        ).delete()
+        touch_follows(user.pk, *added)
+    return added
+
+
+def unfollow_many(user, author_ids):
+    """Отписывает user от авторов; возвращает id отменённых подписок."""
+    with transaction.atomic():
+        lock_follows(user)
+        removed = set(Follow.objects.filter(
+            user=user, author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+        if not removed:
+            return removed
+        _delete_follows(user, removed)
+        UserStats.objects.add_many(removed, followers_count=-1)
+        UserStats.objects.add(user.pk, following_count=-len(removed))
+        TimelineEntry.objects.filter(
+            user=user, author_id__in=removed
+        ).delete()
+        touch_follows(user.pk, *removed)
+    return removed
+
+
+def _candidates(user_ids):
+    """(пользователь, кандидат) -> [пути через подписки, общие посты]."""
+    found = defaultdict(lambda: [0, 0])
+    mutual = Follow.objects.values(
+        source=F('user__following__user'), candidate=F('author')
+    ).filter(source__in=user_ids).annotate(paths=Count('pk')).order_by()
+    for row in mutual.iterator():
+        found[row['source'], row['candidate']][0] = row['paths']
+    shared = Comment.objects.values(
+        source=F('post__comments__author'), candidate=F('author')
+    ).filter(source__in=user_ids).annotate(
+        posts=Count('post', distinct=True)
+    ).order_by()
+    for row in shared.iterator():
+        found[row['source'], row['candidate']][1] = row['posts']
+    return found
+
+
+def suggestions_for(user_ids):
+    """Лучшие SUGGESTIONS_COUNT рекомендаций каждого пользователя."""
+    followed = set(Follow.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'author_id'
+    ))
+    by_user = defaultdict(list)
+    for (user_id, candidate), (mutual, shared) in _candidates(
+        user_ids
+    ).items():
+        if user_id == candidate or (user_id, candidate) in followed:
+            continue
+        by_user[user_id].append(FollowSuggestion(
+            user_id=user_id,
+            suggested_id=candidate,
+            score=mutual * MUTUAL_WEIGHT + shared * SHARED_POST_WEIGHT,
+            mutual_follows=mutual,
+            shared_posts=shared,
+        ))
+    for suggestions in by_user.values():
+        suggestions.sort(key=lambda item: (-item.score, item.suggested_id))
+        yield from suggestions[:settings.SUGGESTIONS_COUNT]
+
+
+def rebuild_suggestions(user_ids):
+    """Пересчитывает рекомендации пользователей; возвращает их число."""
+    suggestions = list(suggestions_for(user_ids))
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FollowSuggestion.objects.bulk_create(
+            suggestions, batch_size=BATCH_SIZE
+        )
+    return len(suggestions)
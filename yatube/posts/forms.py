@@ -1,8 +1,12 @@
+from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 from pytils.translit import slugify
 
-from .models import Comment, Post
+from . import uploads
+from .models import Comment, Group, Post, User
 
 
 class PostForm(ModelForm):
@@ -12,6 +16,20 @@ class PostForm(ModelForm):
         labels = {'group': 'Группа', 'text': 'Текст'}
         help_texts = {'text': ('Обязательное поле для заполнения')}
 
+    def clean_image(self):
+        """Уменьшает новую картинку и убирает из неё метаданные."""
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        return uploads.process(image)
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            image = self.cleaned_data.get('image')
+            self.instance.image_width = getattr(image, 'width', None)
+            self.instance.image_height = getattr(image, 'height', None)
+        return super().save(commit)
+
     def clean_slug(self):
         """Обрабатывает случай, если slug не уникален."""
         cleaned_data = super().clean()
@@ -33,3 +51,29 @@ class CommentForm(ModelForm):
         fields = ['text']
         labels = {'text': 'Добавить комментарий'}
         help_texts = {'text': 'Текст комментария'}
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Поиск', max_length=200)
+    group = forms.ModelChoiceField(
+        Group.objects.all(), to_field_name='slug', required=False,
+        label='Группа', empty_label='Все группы',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    author = forms.CharField(label='Автор', max_length=150, required=False)
+
+
+class FollowManyForm(forms.Form):
+    authors = forms.ModelMultipleChoiceField(
+        User.objects.only('pk'), to_field_name='username', label='Авторы',
+    )
+
+    def clean_authors(self):
+        authors = self.cleaned_data['authors']
+        if len(authors) > settings.FOLLOWS_BATCH_LIMIT:
+            raise ValidationError(
+                'Не больше %(limit)s авторов за раз.',
+                params={'limit': settings.FOLLOWS_BATCH_LIMIT},
+                code='too_many_authors',
+            )
+        return authors
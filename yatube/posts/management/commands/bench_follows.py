@@ -0,0 +1,120 @@
+import logging
+import statistics
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts.bulk import BATCH_SIZE
+from posts.models import Follow, User, UserStats
+from posts.paginators import CursorPaginator
+from posts.views import FOLLOW_ORDERING
+
+DUMMY_CACHE = 'django.core.cache.backends.dummy.DummyCache'
+
+
+def seed(followers):
+    """Автор с followers подписчиками; сам он подписан на 100 из них."""
+    star = User.objects.create_user(username='star')
+    User.objects.bulk_create((
+        User(username=f'fan_{number}', password='!')
+        for number in range(followers)
+    ), batch_size=BATCH_SIZE)
+    fans = User.objects.exclude(pk=star.pk).values_list('pk', flat=True)
+    Follow.objects.bulk_create((
+        Follow(user_id=fan, author=star) for fan in fans.iterator()
+    ), batch_size=BATCH_SIZE)
+    Follow.objects.bulk_create(
+        Follow(user=star, author_id=fan) for fan in fans[:100]
+    )
+    call_command('rebuild_user_stats', stdout=StringIO())
+    return star
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет профиль и списки подписчиков автора с большим числом '
+        'подписчиков на временной базе: счётчики UserStats против '
+        'COUNT(*), курсор против OFFSET.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, followers, repeat, **options):
+        # Строки лога метрик на каждый запрос здесь только мешают.
+        logging.getLogger('core.metrics').setLevel(logging.WARNING)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=['testserver'],
+                CACHES={'default': {'BACKEND': DUMMY_CACHE}},
+            ):
+                started = time.perf_counter()
+                star = seed(followers)
+                self.stdout.write(
+                    f'Подписчиков: {followers}, заполнение '
+                    f'{time.perf_counter() - started:.1f} с'
+                )
+                self.report(self.measure(star, followers, repeat))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def measure(self, star, followers, repeat):
+        client = Client()
+        followers_url = reverse('posts:followers', args=[star.username])
+        follows = Follow.objects.filter(author=star).select_related('user')
+        per_page = settings.FOLLOWS_COUNT
+        middle = followers // 2
+        paginator = CursorPaginator(follows, per_page, FOLLOW_ORDERING)
+        middle_cursor = paginator.encode_cursor(
+            follows.order_by(*FOLLOW_ORDERING)[middle - 1]
+        )
+        profile_url = reverse('posts:profile', args=[star.username])
+        following_url = reverse('posts:following', args=[star.username])
+        cases = {
+            'COUNT(*) подписчиков': (
+                lambda: Follow.objects.filter(author=star).count()
+            ),
+            'счётчик UserStats': (
+                lambda: UserStats.objects.get(pk=star.pk).followers_count
+            ),
+            'середина, OFFSET': lambda: list(
+                follows.order_by(*FOLLOW_ORDERING)[middle:middle + per_page]
+            ),
+            'середина, курсор': lambda: list(paginator.page(middle_cursor)),
+            'страница профиля': lambda: client.get(profile_url),
+            'подписчики, 1-я стр.': lambda: client.get(followers_url),
+            'подписчики, середина': lambda: client.get(
+                followers_url, {'cursor': middle_cursor}
+            ),
+            'подписки, 1-я стр.': lambda: client.get(following_url),
+        }
+        results = {}
+        for name, case in cases.items():
+            case()
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    case()
+                    timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (len(captured), statistics.median(timings))
+        return results
+
+    def report(self, results):
+        self.stdout.write(f'{"":<24}{"запросов":>9}{"p50, мс":>10}')
+        for name, (queries, milliseconds) in results.items():
+            self.stdout.write(
+                f'{name:<24}{queries:>9}{milliseconds:>10.2f}'
+            )
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post
+
+# Ширина окна и плотность пикселей типичных экранов.
+VIEWPORTS = ((360, 3), (414, 2), (768, 2), (1366, 1), (1920, 1))
+# Ширина картинки в ленте: до 960 CSS-пикселей (см. SIZES у тега).
+MAX_SLOT_WIDTH = 960
+
+
+def choose(candidates, needed):
+    """Миниатюра, которую браузер выберет из srcset: самая узкая
+    не уже needed, а если таких нет — самая широкая."""
+    wide_enough = [item for item in candidates if item[0] >= needed]
+    if wide_enough:
+        return min(wide_enough)
+    return max(candidates)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём картинок первой страницы ленты: одна миниатюра '
+        '960x339 для всех экранов и миниатюра из srcset по ширине экрана.'
+    )
+
+    def size(self, thumbnail):
+        return default.storage.size(thumbnail.name)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.for_feed().exclude(image='')[
+            :settings.ITEMS_COUNT
+        ]
+        before = 0
+        candidates = []
+        for post in posts:
+            thumbnails.generate(post.image.name)
+            feed = thumbnails.cached(post.image, 'feed')
+            if feed is None:
+                continue
+            before += self.size(feed)
+            candidates.append([
+                (thumbnail.width, self.size(thumbnail))
+                for thumbnail in (
+                    thumbnails.cached(post.image, name)
+                    for name in thumbnails.SRCSETS['feed']
+                )
+                if thumbnail is not None
+            ] or [(feed.width, self.size(feed))])
+        if not candidates:
+            self.stdout.write('В ленте нет постов с картинками.')
+            return
+        self.stdout.write(
+            f'Картинок на странице: {len(candidates)}, формат srcset: '
+            f'{thumbnails.SRCSET_FORMAT}'
+        )
+        self.stdout.write(f'{"экран":>10} {"было, КБ":>10} {"стало, КБ":>10}')
+        for width, density in VIEWPORTS:
+            needed = min(width, MAX_SLOT_WIDTH) * density
+            after = sum(
+                choose(items, needed)[1] for items in candidates
+            )
+            self.stdout.write(
+                f'{width:>6}@{density}x {before / 1024:10.1f} '
+                f'{after / 1024:10.1f} ({after / before - 1:+.0%})'
+            )
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import Context, Template
+from django.template.loader import render_to_string
+
+from posts.paginators import elide_pages
+
+# Прежний цикл шаблона: ссылка на каждую страницу.
+FULL_RANGE = Template(
+    '{% for i in page_obj.paginator.page_range %}'
+    '{% if page_obj.number == i %}'
+    '<li class="page-item active"><span class="page-link">{{ i }}</span>'
+    '</li>{% else %}'
+    '<li class="page-item"><a class="page-link" href="?page={{ i }}">'
+    '{{ i }}</a></li>{% endif %}{% endfor %}'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время отрисовки и размер блока страниц при ссылке '
+        'на каждую страницу и при сокращённом списке страниц.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def measure(self, render, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            html = render()
+        elapsed = (time.perf_counter() - started) / repeat
+        return elapsed * 1000, len(html.encode())
+
+    def handle(self, *args, posts, repeat, **options):
+        # Отрисовка зависит только от числа записей, а не от них самих.
+        paginator = Paginator(range(posts), settings.ITEMS_COUNT)
+        page_obj = elide_pages(paginator.get_page(paginator.num_pages // 2))
+        context = {'page_obj': page_obj}
+        self.stdout.write(
+            f'Записей: {posts}, страниц: {paginator.num_pages}'
+        )
+        for label, render in (
+            ('все страницы', lambda: FULL_RANGE.render(Context(context))),
+            ('сокращённый', lambda: render_to_string(
+                'posts/includes/paginator.html', context
+            )),
+        ):
+            milliseconds, size = self.measure(render, repeat)
+            self.stdout.write(
+                f'{label:>14}: {milliseconds:8.2f} мс, {size / 1024:8.1f} КБ'
+            )
@@ -0,0 +1,170 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.db.utils import OperationalError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.sqlite import PROFILES, sqlite_profile
+from posts import benchmarks
+from posts.models import Group, Post, User
+
+DUMMY_CACHE = 'django.core.cache.backends.dummy.DummyCache'
+
+
+def _requests(role, number, targets):
+    """Бесконечная последовательность запросов процесса."""
+    if role == 'read':
+        addresses = [reverse('posts:index')] + [
+            reverse('posts:group_list', args=[slug])
+            for slug in targets['groups']
+        ]
+        while True:
+            for address in addresses:
+                yield 'get', address, None
+    address = reverse('posts:add_comment', args=[targets['post']])
+    while True:
+        yield 'post', address, {'text': f'Нагрузка {number}'}
+
+
+def run_worker(role, number, duration, targets):
+    """Процесс-читатель или писатель: (роль, запросов, ошибок блокировки)."""
+    client = Client()
+    if role == 'write':
+        client.force_login(User.objects.get(pk=targets['users'][number]))
+    done = locked = 0
+    deadline = time.monotonic() + duration
+    try:
+        for method, address, data in _requests(role, number, targets):
+            if time.monotonic() >= deadline:
+                break
+            try:
+                getattr(client, method)(address, data)
+                done += 1
+            except OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                locked += 1
+            # Тестовый клиент не закрывает соединения по окончании
+            # запроса, как это делает WSGI-обработчик (CONN_MAX_AGE).
+            close_old_connections()
+    finally:
+        connections.close_all()
+    return role, done, locked
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: параллельные читатели лент и писатели '
+        'комментариев на временной базе-файле для каждого профиля базы '
+        '(см. core/sqlite.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0)
+        parser.add_argument(
+            '--profiles', nargs='+', choices=list(PROFILES),
+            default=list(PROFILES),
+        )
+
+    def handle(self, *args, readers, writers, duration, profiles,
+               **options):
+        # Строки лога метрик на каждый запрос здесь только мешают.
+        logging.getLogger('core.metrics').setLevel(logging.WARNING)
+        directory = tempfile.mkdtemp()
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings['NAME']
+        # Нужен файл: у базы в памяти нет ни WAL, ни других процессов.
+        test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        results = {}
+        try:
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=['testserver'],
+                MEDIA_ROOT=directory,
+                THUMBNAIL_WORKERS=0,
+                CACHES={'default': {'BACKEND': DUMMY_CACHE}},
+            ):
+                benchmarks.seed(users=max(writers, 20), groups=5,
+                                posts=2000, comments=2000, follows=100)
+                targets = {
+                    'users': list(
+                        User.objects.values_list('pk', flat=True)[:writers]
+                    ),
+                    'groups': list(
+                        Group.objects.values_list('slug', flat=True)[:3]
+                    ),
+                    'post': Post.objects.values_list('pk', flat=True)[0],
+                }
+                for profile in profiles:
+                    results[profile] = self.run(
+                        profile, readers, writers, duration, targets
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+            shutil.rmtree(directory, ignore_errors=True)
+        self.report(results, duration)
+
+    def run(self, profile, readers, writers, duration, targets):
+        database, pragmas = sqlite_profile(profile)
+        # Режим журнала хранится в файле базы: для профиля без WAL
+        # возвращаем режим по умолчанию.
+        pragmas = {'journal_mode': 'DELETE', **pragmas}
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict[key] for key in database}
+        connections.close_all()
+        settings_dict.update(database)
+        try:
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                connection.ensure_connection()
+                # Процессы наследуют соединения с БД при fork.
+                connections.close_all()
+                tasks = [('read', number) for number in range(readers)]
+                tasks += [('write', number) for number in range(writers)]
+                with ProcessPoolExecutor(
+                    len(tasks), mp_context=multiprocessing.get_context('fork')
+                ) as pool:
+                    futures = [
+                        pool.submit(
+                            run_worker, role, number, duration, targets
+                        )
+                        for role, number in tasks
+                    ]
+                    totals = {'read': [0, 0], 'write': [0, 0]}
+                    for future in futures:
+                        role, done, locked = future.result()
+                        totals[role][0] += done
+                        totals[role][1] += locked
+        finally:
+            connections.close_all()
+            settings_dict.update(saved)
+        return totals
+
+    def report(self, results, duration):
+        self.stdout.write(
+            f'{"профиль":<14}{"чтений/с":>10}{"записей/с":>11}'
+            f'{"locked":>8}'
+        )
+        for profile, totals in results.items():
+            (reads, read_locked), (writes, write_locked) = (
+                totals['read'], totals['write']
+            )
+            self.stdout.write(
+                f'{profile:<14}{reads / duration:>10.1f}'
+                f'{writes / duration:>11.1f}'
+                f'{read_locked + write_locked:>8}'
+            )
@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.cache import LOCMEM_BACKEND
+from posts import benchmarks
+
+BASELINES = os.path.join(
+    os.path.dirname(benchmarks.__file__), 'bench_baselines.json'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет временную базу синтетическими данными и замеряет '
+        'страницы posts: число запросов, p50/p95 времени и пик памяти. '
+        'Завершается ошибкой при регрессии относительно базовых значений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--baselines', default=BASELINES)
+        parser.add_argument(
+            '--threshold', type=float, default=0.5,
+            help='Допустимый рост времени и памяти, доля от базы.',
+        )
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Записать результат как новые базовые значения.',
+        )
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            # Как в рабочем режиме: без DEBUG и панели отладки.
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=['testserver'],
+                MEDIA_ROOT=media_root,
+                THUMBNAIL_WORKERS=0,
+                CACHES={'default': {
+                    'BACKEND': LOCMEM_BACKEND, 'LOCATION': 'bench-views',
+                }},
+            ):
+                benchmarks.seed(
+                    users=options['users'], groups=options['groups'],
+                    posts=options['posts'], comments=options['comments'],
+                    follows=options['follows'],
+                )
+                results = benchmarks.measure(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.report(results)
+
+        if options['save']:
+            with open(options['baselines'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+                file.write('\n')
+            self.stdout.write(f'Базовые значения: {options["baselines"]}')
+            return
+        if not os.path.exists(options['baselines']):
+            self.stdout.write('Базовых значений нет, сравнение пропущено.')
+            return
+        with open(options['baselines']) as file:
+            baselines = json.load(file)
+        regressions = benchmarks.compare(
+            results, baselines, options['threshold']
+        )
+        if regressions:
+            raise CommandError('\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"страница":<14}{"запросов":>10}{"p50, мс":>10}'
+            f'{"p95, мс":>10}{"память, КБ":>12}'
+        )
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name:<14}{metrics["queries"]:>10}'
+                f'{metrics["p50_ms"]:>10}{metrics["p95_ms"]:>10}'
+                f'{metrics["peak_kb"]:>12}'
+            )
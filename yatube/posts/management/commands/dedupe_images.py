@@ -0,0 +1,109 @@
+import os
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import feed_cache
+from posts.models import LastModified, Post, StoredImage
+from posts.bulk import BATCH_SIZE, batches
+from posts.storage import content_hash
+
+
+class Command(BaseCommand):
+    help = (
+        'Объединяет одинаковые по содержимому картинки постов в один '
+        'файл (см. posts/storage.py): посты переводятся на него, '
+        'дубликаты и их миниатюры удаляются, а число ссылок на файлы '
+        'пересчитывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def handle(self, *args, dry_run, **options):
+        field = Post.image.field
+        self.storage = field.storage
+        by_hash = self.hash_files(field.upload_to)
+        known = dict(StoredImage.objects.values_list('sha256', 'name'))
+        canonical = {}
+        duplicates = {}
+        for sha256, names in by_hash.items():
+            # Файл, который уже в хранилище, или самое короткое имя —
+            # обычно это первая загрузка.
+            name = known.get(sha256)
+            if name not in names:
+                name = min(names, key=lambda name: (len(name), name))
+            canonical[sha256] = name
+            for duplicate in names:
+                if duplicate != name:
+                    duplicates[duplicate] = name
+        reclaimed = sum(self.storage.size(name) for name in duplicates)
+        if not dry_run:
+            self.merge(duplicates)
+            self.count_refs(canonical)
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(
+            f'Картинок: {len(canonical) + len(duplicates)}, '
+            f'{verb.lower()} дубликатов: {len(duplicates)}, '
+            f'освобождено {reclaimed / 1024 / 1024:.1f} МБ'
+        )
+
+    def hash_files(self, directory):
+        """SHA-256 -> имена файлов с таким содержимым."""
+        media_root = self.storage.path('')
+        by_hash = defaultdict(list)
+        for path, _, files in os.walk(self.storage.path(directory)):
+            for filename in files:
+                name = os.path.relpath(
+                    os.path.join(path, filename), media_root
+                ).replace(os.sep, '/')
+                with self.storage.open(name) as content:
+                    by_hash[content_hash(content)].append(name)
+        return by_hash
+
+    def merge(self, duplicates):
+        """Переводит посты на общий файл и удаляет дубликаты."""
+        scopes = {feed_cache.POSTS}
+        for batch in batches(duplicates, BATCH_SIZE):
+            posts = Post.objects.filter(image__in=batch).values_list(
+                'author_id', 'group_id'
+            )
+            for author_id, group_id in posts:
+                scopes.add(feed_cache.author_scope(author_id))
+                if group_id:
+                    scopes.add(feed_cache.group_scope(group_id))
+        with transaction.atomic():
+            for duplicate, name in duplicates.items():
+                Post.objects.filter(image=duplicate).update(image=name)
+        # Адреса картинок в лентах изменились.
+        feed_cache.bump(*scopes)
+        LastModified.objects.touch(*scopes)
+        for duplicate in duplicates:
+            default.kvstore.delete(ImageFile(duplicate, self.storage))
+            self.storage.delete(duplicate)
+
+    def count_refs(self, canonical):
+        """Пересобирает StoredImage по файлам и постам."""
+        refs = dict(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image'
+            ).annotate(refs=Count('pk'))
+        )
+        rows = (
+            StoredImage(
+                name=name, sha256=sha256, size=self.storage.size(name),
+                refs=refs.get(name, 0),
+            )
+            for sha256, name in canonical.items()
+        )
+        with transaction.atomic():
+            StoredImage.objects.all().delete()
+            for batch in batches(rows, BATCH_SIZE):
+                StoredImage.objects.bulk_create(batch)
@@ -0,0 +1,82 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.paginators import CursorPaginator
+from posts.views import FOLLOW_ORDERING, TIMELINE_ORDERING
+
+# Строки плана SQLite, означающие чтение всей таблицы или сортировку
+# без индекса.
+FULL_SCAN = re.compile(
+    r'\bSCAN (?!.*\bUSING\b)|USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY'
+)
+
+
+def feed_queries(post_id=0, user_id=0, group_id=0):
+    """Запросы лент из posts.views, по одному на каждый способ выборки."""
+    limit = settings.ITEMS_COUNT
+    posts = Post.objects.for_feed()
+    cursor = CursorPaginator(posts, limit)
+    follows = CursorPaginator(
+        Follow.objects.all(), settings.FOLLOWS_COUNT, FOLLOW_ORDERING
+    )
+    return {
+        'index': posts[:limit],
+        'index (курсор)': posts.order_by(*cursor.ordering).filter(
+            cursor._boundary([timezone.now(), post_id], False)
+        )[:limit + 1],
+        'group_posts': posts.filter(group_id=group_id)[:limit],
+        'profile': posts.filter(author_id=user_id)[:limit],
+        'comments': Comment.objects.filter(post_id=post_id).order_by(
+            'created', 'pk'
+        )[:settings.COMMENTS_COUNT + 1],
+        'follow_index': TimelineEntry.objects.filter(
+            user_id=user_id
+        ).order_by(*TIMELINE_ORDERING)[:limit],
+        'pulled_authors': timeline.pulled_authors(user_id),
+        'fan_out': Follow.objects.filter(author_id=user_id).values_list(
+            'user_id', flat=True
+        ),
+        'followers (курсор)': Follow.objects.filter(
+            author_id=user_id
+        ).select_related('user').order_by(*FOLLOW_ORDERING).filter(
+            follows._boundary([user_id], False)
+        )[:settings.FOLLOWS_COUNT + 1],
+        'following (курсор)': Follow.objects.filter(
+            user_id=user_id
+        ).select_related('author').order_by(*FOLLOW_ORDERING).filter(
+            follows._boundary([user_id], False)
+        )[:settings.FOLLOWS_COUNT + 1],
+    }
+
+
+def full_scans(plan):
+    return [line for line in plan.splitlines() if FULL_SCAN.search(line)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает план выполнения (EXPLAIN) запросов лент. С --check '
+        'завершается ошибкой, если запрос читает таблицу целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true')
+
+    def handle(self, *args, check, **options):
+        failed = []
+        for name, queryset in feed_queries().items():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            if full_scans(plan):
+                failed.append(name)
+        if failed:
+            message = 'Полный просмотр таблицы: ' + ', '.join(failed)
+            if check:
+                raise CommandError(message)
+            self.stderr.write(message)
@@ -0,0 +1,28 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в каталог с файлами JSON Lines и картинками постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+
+    def handle(self, *args, directory, **options):
+        os.makedirs(directory, exist_ok=True)
+        for name in transfer.EXPORTS:
+            started = time.perf_counter()
+            rows = transfer.export_model(name, directory)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name}: {rows} строк за {elapsed:.1f} с '
+                f'({rows / max(elapsed, 1e-6):.0f} строк/с)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Выгружено в {directory}'))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+
+from posts import feed_cache, transfer
+from posts.models import Comment, Post
+
+# Производные данные, которые bulk_create не обновляет.
+REBUILD_COMMANDS = (
+    'rebuild_user_stats', 'rebuild_timelines', 'rebuild_search_index',
+    'rebuild_last_modified', 'dedupe_images',
+)
+
+
+class Command(BaseCommand):
+    help = 'Загружает выгрузку manage.py export_posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help=(
+                'Не пересобирать счётчики, ленты, поисковый индекс и '
+                'ссылки на картинки.'
+            ),
+        )
+
+    def handle(self, *args, directory, skip_rebuild, **options):
+        total = 0
+        remapped = transfer.new_remapped()
+        for name in transfer.EXPORTS:
+            started = time.perf_counter()
+            rows = transfer.import_model(
+                name, directory, remapped
+            )
+            elapsed = time.perf_counter() - started
+            total += rows
+            self.stdout.write(
+                f'{name}: {rows} строк за {elapsed:.1f} с '
+                f'({rows / max(elapsed, 1e-6):.0f} строк/с)'
+            )
+        if not total:
+            raise CommandError(f'В {directory} нет данных для загрузки')
+        # Посты и комментарии загружены со своими id: счётчики
+        # последовательностей (в PostgreSQL) нужно сдвинуть за них.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        if not skip_rebuild:
+            for command in REBUILD_COMMANDS:
+                call_command(command, stdout=self.stdout)
+        feed_cache.bump(feed_cache.POSTS, feed_cache.GROUPS)
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
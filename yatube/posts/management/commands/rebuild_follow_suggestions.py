@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import follows
+from posts.models import User
+from posts.bulk import batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации, на кого подписаться: по подпискам '
+        'подписок и общим комментариям (см. posts/follows.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Пользователей на один пересчёт.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        started = time.perf_counter()
+        users = suggestions = 0
+        user_ids = User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator()
+        for batch in batches(user_ids, batch_size):
+            suggestions += follows.rebuild_suggestions(batch)
+            users += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {users}, рекомендаций: {suggestions}, '
+            f'{time.perf_counter() - started:.1f} с'
+        ))
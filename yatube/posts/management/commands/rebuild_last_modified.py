@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Q
+
+from posts import feed_cache
+from posts.bulk import BATCH_SIZE, batches
+from posts.models import LastModified, Post
+
+# Область -> поле поста, по которому группируются посты области.
+SCOPES = {
+    feed_cache.group_scope: 'group',
+    feed_cache.author_scope: 'author',
+}
+
+
+def last_modified_rows():
+    newest = Post.objects.aggregate(latest=Max('updated_at'))['latest']
+    if newest is not None:
+        yield LastModified(scope=feed_cache.POSTS, modified=newest)
+    for scope, field in SCOPES.items():
+        latest = Post.objects.filter(**{f'{field}__isnull': False}).order_by(
+        ).values(field).annotate(latest=Max('updated_at'))
+        for row in latest.iterator():
+            yield LastModified(scope=scope(row[field]), modified=row['latest'])
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает время последнего изменения лент по постам.'
+
+    def handle(self, *args, **options):
+        rebuilt = Q(scope=feed_cache.POSTS)
+        for scope in SCOPES:
+            rebuilt |= Q(scope__startswith=scope(''))
+        # Время изменения групп и подписок из постов не восстановить.
+        # Пока ленты не пересчитаны, страницы отдаются без
+        # Last-Modified, а не с устаревшим.
+        LastModified.objects.filter(rebuilt).delete()
+        count = 0
+        for batch in batches(last_modified_rows(), BATCH_SIZE):
+            with transaction.atomic():
+                LastModified.objects.bulk_create(batch)
+            count += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано лент: {count}'))
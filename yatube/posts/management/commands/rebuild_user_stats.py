@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Follow, Post, User, UserStats
+from posts.bulk import BATCH_SIZE, batches
+
+# Счётчик в UserStats -> (модель, поле со ссылкой на пользователя).
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def count_subquery(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by(
+    ).values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def save_counters(counters_by_user):
+    """Записывает счётчики пачками: строки, которых нет, создаются."""
+    for pks in batches(counters_by_user, BATCH_SIZE):
+        existing = UserStats.objects.in_bulk(pks)
+        for pk, stats in existing.items():
+            for counter, value in counters_by_user[pk].items():
+                setattr(stats, counter, value)
+        UserStats.objects.bulk_update(existing.values(), list(COUNTERS))
+        UserStats.objects.bulk_create(
+            UserStats(user_id=pk, **counters_by_user[pk])
+            for pk in pks if pk not in existing
+        )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает (или сверяет) счётчики пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить счётчики, ничего не меняя.',
+        )
+
+    def handle(self, *args, verify=False, **options):
+        annotations = {}
+        for counter, (model, field) in COUNTERS.items():
+            stored = UserStats.objects.filter(
+                user=OuterRef('pk')
+            ).values(counter)
+            annotations[f'stored_{counter}'] = Coalesce(
+                Subquery(stored, output_field=IntegerField()), 0
+            )
+            annotations[f'actual_{counter}'] = count_subquery(model, field)
+        users = User.objects.annotate(**annotations).order_by('pk').values(
+            'pk', *annotations
+        )
+        # Пачками: расхождения одной пачки исправляются в своей
+        # транзакции, в памяти не копятся счётчики всех пользователей.
+        total = 0
+        for rows in batches(users.iterator(), BATCH_SIZE):
+            mismatched = self.mismatched(rows)
+            total += len(mismatched)
+            if mismatched and not verify:
+                with transaction.atomic():
+                    save_counters(mismatched)
+        if verify:
+            if total:
+                raise CommandError(
+                    f'Расходятся счётчики у {total} пользователей'
+                )
+            self.stdout.write(self.style.SUCCESS('Счётчики в порядке'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлены счётчики у {total} пользователей'
+        ))
+
+    def mismatched(self, rows):
+        """pk -> настоящие счётчики для строк с расхождениями."""
+        mismatched = {}
+        for row in rows:
+            for counter in COUNTERS:
+                stored = row[f'stored_{counter}']
+                actual = row[f'actual_{counter}']
+                if stored != actual:
+                    mismatched[row['pk']] = {
+                        name: row[f'actual_{name}'] for name in COUNTERS
+                    }
+                    self.stdout.write(
+                        f'Пользователь {row["pk"]}, {counter}: '
+                        f'в счётчике {stored}, на самом деле {actual}'
+                    )
+        return mismatched
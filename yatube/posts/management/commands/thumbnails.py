@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from posts import thumbnails
+from posts.bulk import batches
+from posts.models import Post
+
+# Файлы миниатюр моложе этого не удаляются: веб-воркеры создают их в
+# фоне, и sorl пишет файл раньше записи в хранилище.
+GC_GRACE_SECONDS = 60 * 60
+
+
+def drop_inherited_connections():
+    """Забывает соединения с БД, унаследованные от родителя при fork.
+    Закрывать их нельзя: закрылось бы и соединение родителя."""
+    for connection in connections.all():
+        connection.connection = None
+
+
+def warm_batch(names):
+    """Создаёт миниатюры пачки картинок в отдельном процессе."""
+    try:
+        return len(names), sum(thumbnails.generate(name) for name in names)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'warm — создаёт недостающие миниатюры картинок постов, '
+        'gc — удаляет миниатюры и записи хранилища sorl-thumbnail, '
+        'которые не относятся ни к одному посту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('warm', 'gc', 'all'))
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Число процессов для warm; 0 — в текущем процессе.',
+        )
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Для gc: только показать, что будет удалено.',
+        )
+        parser.add_argument(
+            '--grace', type=int, default=GC_GRACE_SECONDS,
+            help='Для gc: не удалять файлы моложе стольких секунд.',
+        )
+
+    def handle(self, *args, action, processes, batch_size, dry_run, grace,
+               **options):
+        if action in ('warm', 'all'):
+            self.warm(processes, batch_size)
+        if action in ('gc', 'all'):
+            self.gc(dry_run, grace)
+
+    def warm(self, processes, batch_size):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        started = time.perf_counter()
+        images = created = 0
+        if processes:
+            # Имена читаются до fork: открытый курсор и соединение не
+            # должны достаться рабочим процессам.
+            names = list(names)
+            connections.close_all()
+            with ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context('fork'),
+                initializer=drop_inherited_connections,
+            ) as pool:
+                results = pool.map(warm_batch, batches(names, batch_size))
+                for batch_images, batch_created in results:
+                    images += batch_images
+                    created += batch_created
+        else:
+            for batch in batches(names.iterator(), batch_size):
+                batch_images, batch_created = warm_batch(batch)
+                images += batch_images
+                created += batch_created
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Картинок: {images}, создано миниатюр: {created}, '
+            f'{elapsed:.1f} с, {images / max(elapsed, 1e-9):.1f} картинок/с'
+        )
+
+    def gc(self, dry_run, grace):
+        live, orphan_sources = self.find_orphan_sources()
+        removed_files, reclaimed = self.remove_stray_files(
+            live, dry_run, time.time() - grace
+        )
+        if not dry_run:
+            for source in orphan_sources:
+                if isinstance(source, str):
+                    default.kvstore._delete(source, identity='thumbnails')
+                else:
+                    default.kvstore.delete(source, delete_thumbnails=True)
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(
+            f'{verb}: записей хранилища {len(orphan_sources)}, '
+            f'файлов {removed_files}, '
+            f'освобождено {reclaimed / 1024 / 1024:.1f} МБ'
+        )
+
+    def find_orphan_sources(self):
+        """Имена миниатюр картинок постов и записи хранилища sorl
+        о картинках, которых нет ни у одного поста или которые
+        записаны с другим хранилищем (до смены хранилища картинок)."""
+        kvstore = default.kvstore
+        referenced = set(
+            Post.objects.exclude(image='').values_list('image', flat=True)
+        )
+        storage_class = type(Post.image.field.storage)
+        live = set()
+        orphan_sources = []
+        for key in kvstore._find_keys(identity='thumbnails'):
+            source = kvstore._get(key)
+            if (source is None or source.name not in referenced
+                    or not isinstance(source.storage, storage_class)):
+                orphan_sources.append(source or key)
+                continue
+            for thumbnail_key in kvstore._get(
+                key, identity='thumbnails'
+            ) or []:
+                thumbnail = kvstore._get(thumbnail_key)
+                if thumbnail is not None:
+                    live.add(thumbnail.name)
+        return live, orphan_sources
+
+    def remove_stray_files(self, live, dry_run, older_than):
+        """Удаляет файлы в каталоге миниатюр, кроме live и изменённых
+        после older_than."""
+        media_root = default.storage.path('')
+        root = default.storage.path(thumbnail_settings.THUMBNAIL_PREFIX)
+        removed_files = reclaimed = 0
+        for directory, _, files in os.walk(root, topdown=False):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, media_root).replace(os.sep, '/')
+                if name in live or os.path.getmtime(path) > older_than:
+                    continue
+                removed_files += 1
+                reclaimed += os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+            if not dry_run and directory != root and not os.listdir(directory):
+                os.rmdir(directory)
+        return removed_files, reclaimed
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.28 on 2026-10-17 07:55
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def fill_last_modified(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    LastModified = apps.get_model('posts', 'LastModified')
+    Post.objects.update(updated_at=F('pub_date'))
+    rows = []
+    newest = Post.objects.aggregate(latest=Max('pub_date'))['latest']
+    if newest is not None:
+        rows.append(LastModified(scope='posts', modified=newest))
+    for field, prefix in (('group', 'group'), ('author', 'author')):
+        latest = Post.objects.filter(**{f'{field}__isnull': False}).order_by(
+        ).values(field).annotate(latest=Max('pub_date'))
+        rows.extend(
+            LastModified(scope=f'{prefix}:{row[field]}',
+                         modified=row['latest'])
+            for row in latest.iterator()
+        )
+    LastModified.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LastModified',
+            fields=[
+                ('scope', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Область')),
+                ('modified', models.DateTimeField(verbose_name='Изменена')),
+            ],
+            options={
+                'verbose_name': 'Время изменения ленты',
+                'verbose_name_plural': 'Время изменения лент',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='date updated'),
+        ),
+        migrations.RunPython(fill_last_modified, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-17 08:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_following_count(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    counts = dict(
+        Follow.objects.order_by().values_list('user').annotate(
+            total=Count('pk')
+        )
+    )
+    pks = list(counts)
+    for start in range(0, len(pks), 500):
+        existing = list(
+            UserStats.objects.filter(pk__in=pks[start:start + 500])
+        )
+        for stats in existing:
+            stats.following_count = counts.pop(stats.pk)
+        UserStats.objects.bulk_update(existing, ['following_count'])
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk, following_count=total)
+         for pk, total in counts.items()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_stored_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число подписок'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', '-id'], name='follow_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-id'], name='follow_user_id_idx'),
+        ),
+        migrations.RunPython(
+            fill_following_count, migrations.RunPython.noop
+        ),
+    ]
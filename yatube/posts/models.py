@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import Q, F, CheckConstraint
+from django.db.models import Q, F, CheckConstraint, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .storage import post_image_storage
 
 User = get_user_model()
 
@@ -14,12 +18,23 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа подтягиваются одним запросом."""
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image', 'image_width', 'image_height',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__slug', 'group__title',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
     )
     pub_date = models.DateTimeField('date published', auto_now_add=True)
+    updated_at = models.DateTimeField('date updated', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -38,16 +53,47 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        storage=post_image_storage
+    )
+    # Заполняются при загрузке (см. uploads.py), чтобы шаблонам не нужно
+    # было открывать файл ради размеров.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
     )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Автор и группа на момент загрузки: при их смене пост нужно
+        # убрать из старых счётчиков и кэшей.
+        instance._loaded_author_id = instance.__dict__.get('author_id')
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        if 'image' in instance.__dict__:
+            instance._loaded_image = instance.__dict__['image'] or ''
+        return instance
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Под ленты: общую, группы и профиля (см. manage.py explain_feeds).
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -58,6 +104,12 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField('date published', auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -73,6 +125,239 @@ class Follow(models.Model):
                        name='unique_follower'),
                        CheckConstraint(check=~Q(user=F('author')),
                        name='no_self_following')]
+        # Подписчики автора: раскладка ленты и счётчики; списки
+        # подписчиков и подписок, новые сначала.
+        indexes = [models.Index(fields=['author', 'user'],
+                                name='follow_author_user_idx'),
+                   models.Index(fields=['author', '-id'],
+                                name='follow_author_id_idx'),
+                   models.Index(fields=['user', '-id'],
+                                name='follow_user_id_idx')]
 
     def __str__(self):
         return self.text
+
+
+class UserStatsManager(models.Manager):
+    def add(self, user_id, **deltas):
+        """Атомарно прибавляет deltas к счётчикам пользователя.
+
+        Строка счётчиков создаётся только при увеличении: уменьшение
+        для пользователя без счётчиков (например, при его удалении)
+        ничего не делает.
+        """
+        updates = {
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        }
+        if self.filter(pk=user_id).update(**updates):
+            return
+        if any(delta < 0 for delta in deltas.values()):
+            return
+        _, created = self.get_or_create(user_id=user_id, defaults=deltas)
+        if not created:
+            self.filter(pk=user_id).update(**updates)
+
+    def add_many(self, user_ids, **deltas):
+        """Как add, но для нескольких пользователей сразу: вставка и
+        обновление вместо запросов на каждого."""
+        user_ids = set(user_ids)
+        updates = {
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        }
+        if all(delta >= 0 for delta in deltas.values()):
+            # Сначала недостающие строки с нулями, потом прибавление
+            # одним UPDATE: строку, созданную параллельно, не затрём.
+            self.bulk_create(
+                [self.model(user_id=pk) for pk in user_ids],
+                ignore_conflicts=True,
+            )
+        self.filter(pk__in=user_ids).update(**updates)
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return (
+            f'{self.user_id}: {self.posts_count}/{self.followers_count}/'
+            f'{self.following_count}'
+        )
+
+    @staticmethod
+    def posts_count_for(user):
+        """Число постов пользователя без COUNT(*) по таблице постов."""
+        try:
+            return user.stats.posts_count
+        except UserStats.DoesNotExist:
+            return 0
+
+    @staticmethod
+    def for_user(user):
+        """Счётчики пользователя; нулевые, если строки счётчиков нет."""
+        try:
+            return user.stats
+        except UserStats.DoesNotExist:
+            return UserStats(user=user)
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя (fan-out on write).
+
+    Записи создаются при публикации поста для каждого подписчика
+    автора, поэтому лента подписок читается по индексу (user, pub_date)
+    без соединения с Follow.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        # При равной дате порядок по посту, как в остальных лентах, а не
+        # по id записи, который зависит от порядка раскладки.
+        ordering = ['-pub_date', '-post_id']
+        constraints = [models.UniqueConstraint(fields=['user', 'post'],
+                       name='unique_timeline_entry')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class LastModifiedManager(models.Manager):
+    def touch(self, *scopes, modified=None):
+        """Отмечает, что содержимое областей изменилось в modified
+        (по умолчанию — сейчас)."""
+        scopes = set(scopes)
+        modified = modified or timezone.now()
+        # Время области не уходит назад, если параллельная правка уже
+        # записала более позднее.
+        updated = self.filter(
+            scope__in=scopes, modified__lt=modified
+        ).update(modified=modified)
+        if updated < len(scopes):
+            self.bulk_create(
+                [self.model(scope=scope, modified=modified)
+                 for scope in scopes],
+                ignore_conflicts=True,
+            )
+
+    def latest_for(self, *scopes):
+        """Время последнего изменения любой из областей или None."""
+        return self.filter(scope__in=scopes).aggregate(
+            latest=Max('modified')
+        )['latest']
+
+
+class LastModified(models.Model):
+    """Время последнего изменения области лент.
+
+    Области те же, что у поколений кэша лент (см. feed_cache): все
+    посты, группы, посты группы, посты автора. Время обновляется
+    сигналами при создании, правке и удалении, так что Last-Modified
+    ленты не требует запроса по постам и учитывает правки и удаления.
+    """
+    scope = models.CharField('Область', max_length=100, primary_key=True)
+    modified = models.DateTimeField('Изменена')
+
+    objects = LastModifiedManager()
+
+    class Meta:
+        verbose_name = 'Время изменения ленты'
+        verbose_name_plural = 'Время изменения лент'
+
+    def __str__(self):
+        return f'{self.scope}: {self.modified}'
+
+
+class StoredImageManager(models.Manager):
+    def acquire(self, name):
+        """Добавляет ссылку на картинку, если она в хранилище."""
+        self.filter(name=name).update(refs=F('refs') + 1)
+
+    def release(self, name):
+        """Снимает ссылку на картинку; True, если ссылок не осталось и
+        запись удалена."""
+        self.filter(name=name, refs__gt=0).update(refs=F('refs') - 1)
+        deleted, _ = self.filter(name=name, refs=0).delete()
+        return bool(deleted)
+
+
+class StoredImage(models.Model):
+    """Файл картинки постов в хранилище без дубликатов (см. storage.py).
+
+    Одинаковое содержимое хранится одним файлом; refs — число постов,
+    которые на него ссылаются.
+    """
+    name = models.CharField('Имя файла', max_length=100, unique=True)
+    sha256 = models.CharField('SHA-256', max_length=64, unique=True)
+    size = models.PositiveIntegerField('Размер')
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
+
+    objects = StoredImageManager()
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name}: {self.refs}'
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендация, на кого подписаться.
+
+    Считается заранее командой rebuild_follow_suggestions по подпискам
+    подписок и общим комментариям (см. follows.py), чтобы блок
+    рекомендаций читался одним запросом по индексу.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE,
+                                  related_name='+')
+    score = models.PositiveIntegerField('Вес')
+    mutual_follows = models.PositiveIntegerField(
+        'Подписаны подписки пользователя', default=0
+    )
+    shared_posts = models.PositiveIntegerField(
+        'Посты с общими комментариями', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'suggested'], name='unique_follow_suggestion'
+        )]
+        indexes = [models.Index(fields=['user', '-score', 'suggested'],
+                                name='suggestion_user_score_idx')]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.suggested_id}: {self.score}'
@@ -0,0 +1,191 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+ELLIPSIS = '…'
+
+
+def elided_page_range(page, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS.
+
+    Как Paginator.get_elided_page_range из Django 3.2: число ссылок не
+    зависит от числа страниц.
+    """
+    num_pages = page.paginator.num_pages
+    number = page.number
+    if num_pages <= (on_each_side + on_ends) * 2:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > 1 + on_each_side + on_ends + 1:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
+
+
+def elide_pages(page):
+    """Добавляет странице elided_page_range и маркер пропуска ellipsis,
+    с которым шаблон пагинатора сравнивает элементы списка."""
+    page.elided_page_range = elided_page_range(page)
+    page.ellipsis = ELLIPSIS
+    return page
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу сортировки (keyset pagination).
+
+    Вместо COUNT(*) и OFFSET страница выбирается условием на значения
+    полей сортировки последней показанной записи, поэтому стоимость
+    запроса не зависит от глубины страницы.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-pk')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.model = object_list.model
+
+    def _fields(self):
+        for name in self.ordering:
+            attr = name.lstrip('-')
+            if attr == 'pk':
+                field = self.model._meta.pk
+            else:
+                field = self.model._meta.get_field(attr)
+            yield attr, field, name.startswith('-')
+
+    def encode_cursor(self, obj, reverse=False):
+        values = []
+        for attr, field, _ in self._fields():
+            if isinstance(obj, dict):
+                # Строка из values(): ключи — имена полей сортировки.
+                obj_values = SimpleNamespace(**{field.attname: obj[attr]})
+                values.append(field.value_to_string(obj_values))
+            else:
+                values.append(field.value_to_string(obj))
+        payload = json.dumps(['p' if reverse else 'n'] + values)
+        token = base64.urlsafe_b64encode(payload.encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded).decode())
+            direction, *raw_values = payload
+            fields = list(self._fields())
+            if direction not in ('n', 'p') or len(raw_values) != len(fields):
+                raise InvalidCursor(token)
+            values = [
+                field.to_python(value)
+                for (_, field, _), value in zip(fields, raw_values)
+            ]
+        except (
+            binascii.Error, UnicodeDecodeError, ValueError, TypeError,
+            ValidationError
+        ) as error:
+            raise InvalidCursor(token) from error
+        return direction == 'p', values
+
+    def _boundary(self, values, reverse):
+        """Условие «строго после values» в порядке сортировки."""
+        condition = Q()
+        equal = {}
+        fields = list(self._fields())
+        for (attr, _, descending), value in zip(fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= Q(**equal, **{f'{attr}__{lookup}': value})
+            equal[attr] = value
+        # Нестрогое условие на первое поле отдельно: по нему СУБД может
+        # начать чтение индекса с нужного места, а не с его начала.
+        attr, _, descending = fields[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{attr}__{lookup}': values[0]}) & condition
+
+    def page(self, cursor=None):
+        reverse, values = (False, None)
+        if cursor:
+            reverse, values = self.decode_cursor(cursor)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            )
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._boundary(values, reverse))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], reverse=True)
+        return CursorPage(rows, self, cursor, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        """Как Paginator.get_page: при битом курсоре — первая страница."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+class CursorPage(Sequence):
+    """Страница курсорного вывода.
+
+    Курсоры соседних страниц вычисляются сразу по выбранным строкам,
+    поэтому object_list можно заменить, например, на связанные объекты.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, cursor, next_cursor,
+                 previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page %s>' % (self.cursor or 'first')
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
@@ -0,0 +1,140 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается по СУБД: для SQLite — виртуальная таблица FTS5
+(создаётся миграцией 0011 и обновляется сигналами), для PostgreSQL —
+tsvector, для остальных — поиск подстроки без индекса. У всех
+бэкендов одинаковый интерфейс:
+
+- ``search(queryset, query)`` — посты из queryset, подходящие под
+  запрос, лучшие совпадения первыми;
+- ``index(post)``, ``unindex(post_id)``, ``rebuild()`` — поддержка
+  индекса (для бэкендов без отдельного индекса ничего не делают).
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from .bulk import batches
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+REBUILD_BATCH_SIZE = 1000
+
+WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    # unicode61 снимает диакритику только с латиницы: «ё» приводим сами.
+    return text.lower().replace('ё', 'е')
+
+
+def words(query):
+    return WORD.findall(normalize(query))
+
+
+class ContainsBackend:
+    """Поиск подстроки: каждое слово запроса должно быть в тексте."""
+
+    def search(self, queryset, query):
+        condition = Q()
+        for word in words(query):
+            condition &= Q(text__icontains=word)
+        if not condition:
+            return queryset.none()
+        return queryset.filter(condition).order_by('-pub_date', '-pk')
+
+    def index(self, post):
+        pass
+
+    def unindex(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTSBackend(ContainsBackend):
+    """FTS5: rowid записи индекса равен id поста, ранжирование bm25."""
+
+    def match(self, query):
+        # Слова запроса ищутся как префиксы: «пост» найдёт «посты».
+        return ' '.join(f'"{word}"*' for word in words(query))
+
+    def search(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        # Не filter(pk__in=RawSQL(...)): Django оборачивает подзапрос во
+        # вторые скобки, и SQLite берёт из него только первую строку.
+        return queryset.extra(
+            where=[
+                f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s)'
+            ],
+            params=[match],
+        ).annotate(rank=RawSQL(
+            f'SELECT rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            [match],
+        )).order_by('rank', '-pk')
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, normalize(post.text)],
+            )
+
+    def unindex(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        posts = Post.objects.values_list('pk', 'text')
+        for batch in batches(posts.iterator(), REBUILD_BATCH_SIZE):
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                    [(pk, normalize(text)) for pk, text in batch],
+                )
+
+
+class PostgresBackend(ContainsBackend):
+    """tsvector по тексту; для скорости нужен GIN-индекс по
+    to_tsvector('russian', text)."""
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVector
+        )
+        if not words(query):
+            return queryset.none()
+        vector = SearchVector('text', config='russian')
+        search_query = SearchQuery(query, config='russian')
+        return queryset.annotate(
+            search=vector, rank=SearchRank(vector, search_query)
+        ).filter(search=search_query).order_by(F('rank').desc(), '-pk')
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, ContainsBackend)()
+
+
+def search(queryset, query):
+    return get_backend().search(queryset, query)
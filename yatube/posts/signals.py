@@ -0,0 +1,125 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import feed_cache, follows, search, timeline
+from .models import (Follow, FollowSuggestion, Group, LastModified, Post,
+                     StoredImage, UserStats)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    loaded_author_id = getattr(instance, '_loaded_author_id', None)
+    if created:
+        UserStats.objects.add(instance.author_id, posts_count=1)
+        timeline.reassign(instance)
+        timeline.fan_out(instance)
+    elif loaded_author_id and loaded_author_id != instance.author_id:
+        UserStats.objects.add(loaded_author_id, posts_count=-1)
+        UserStats.objects.add(instance.author_id, posts_count=1)
+        timeline.reassign(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    UserStats.objects.add(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw, **kwargs):
+    if raw or not created:
+        return
+    UserStats.objects.add(instance.author_id, followers_count=1)
+    UserStats.objects.add(instance.user_id, following_count=1)
+    follows.touch_follows(instance.user_id, instance.author_id)
+    timeline.backfill(instance.user_id, instance.author_id)
+    FollowSuggestion.objects.filter(
+        user_id=instance.user_id, suggested_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    UserStats.objects.add(instance.author_id, followers_count=-1)
+    UserStats.objects.add(instance.user_id, following_count=-1)
+    follows.touch_follows(instance.user_id, instance.author_id)
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    author_ids = {
+        instance.author_id, getattr(instance, '_loaded_author_id', None)
+    }
+    group_ids = {
+        instance.group_id, getattr(instance, '_loaded_group_id', None)
+    }
+    scopes = [
+        feed_cache.POSTS,
+        *(feed_cache.author_scope(pk) for pk in author_ids if pk),
+        *(feed_cache.group_scope(pk) for pk in group_ids if pk),
+    ]
+    feed_cache.bump(*scopes)
+    # При удалении время изменения — текущее, а не последней правки.
+    LastModified.objects.touch(*scopes, modified=(
+        instance.updated_at if 'created' in kwargs else None
+    ))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    scopes = [feed_cache.GROUPS, feed_cache.group_scope(instance.pk)]
+    feed_cache.bump(*scopes)
+    LastModified.objects.touch(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    search.get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.get_backend().unindex(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, raw, **kwargs):
+    if raw or not (created or hasattr(instance, '_loaded_image')):
+        return
+    old = getattr(instance, '_loaded_image', '')
+    new = instance.image.name or ''
+    if new == old:
+        return
+    # Сначала новая ссылка: при замене картинки на такую же по
+    # содержимому файл не должен удалиться.
+    if new:
+        StoredImage.objects.acquire(new)
+    if old:
+        instance.image.storage.release(old)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        instance.image.storage.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def remember_saved_post(sender, instance, **kwargs):
+    """Запоминает сохранённых автора и группу.
+
+    Подключается последним, чтобы предыдущие обработчики видели
+    значения, с которыми пост был загружен.
+    """
+    instance._loaded_author_id = instance.author_id
+    instance._loaded_group_id = instance.group_id
+    if 'image' in instance.__dict__:
+        instance._loaded_image = instance.image.name or ''
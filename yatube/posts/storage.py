@@ -0,0 +1,91 @@
+"""Хранилище картинок постов без дубликатов.
+
+Одинаковые по содержимому картинки хранятся одним файлом. При
+сохранении считается SHA-256 содержимого (потоком, по частям), и если
+такая картинка уже есть (модель StoredImage), возвращается имя
+существующего файла, а новый не пишется. Имя файла — имя первой
+загрузки (posts/<имя>), поэтому у одинаковых картинок общие и
+миниатюры: sorl-thumbnail находит их по имени исходника.
+
+StoredImage.refs — число постов, которые ссылаются на файл; его ведут
+сигналы постов (см. signals.py). Когда последний пост удаляется или
+меняет картинку, файл и его миниатюры удаляются. Файлы, которых нет в
+StoredImage (загруженные до появления хранилища или через bulk_create),
+не удаляются никогда; manage.py dedupe_images объединяет одинаковые
+файлы в каталоге картинок и пересчитывает ссылки.
+"""
+import hashlib
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class DeduplicatingStorage(FileSystemStorage):
+    def _existing(self, sha256):
+        """Имя сохранённой картинки с таким содержимым или None."""
+        from .models import StoredImage
+
+        name = StoredImage.objects.filter(sha256=sha256).values_list(
+            'name', flat=True
+        ).first()
+        if name is None:
+            return None
+        if not self.exists(name):
+            # Файл удалили мимо хранилища: запись больше не нужна.
+            StoredImage.objects.filter(name=name).delete()
+            return None
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredImage
+
+        sha256 = content_hash(content)
+        existing = self._existing(sha256)
+        if existing is not None:
+            return existing
+        name = super()._save(name, content)
+        try:
+            with transaction.atomic():
+                StoredImage.objects.create(
+                    name=name, sha256=sha256, size=content.size
+                )
+        except IntegrityError:
+            # Такую же картинку одновременно сохранил другой запрос.
+            self.delete(name)
+            existing = self._existing(sha256)
+            if existing is None:
+                raise
+            return existing
+        return name
+
+    def release(self, name):
+        """Снимает ссылку поста на картинку. С последней ссылкой
+        удаляются файл и его миниатюры (после фиксации транзакции);
+        возвращает True, если удалены."""
+        from .models import StoredImage
+
+        if not StoredImage.objects.release(name):
+            return False
+        transaction.on_commit(lambda: self._remove(name))
+        return True
+
+    def _remove(self, name):
+        default.kvstore.delete(ImageFile(name, self))
+        self.delete(name)
+
+
+post_image_storage = DeduplicatingStorage()
@@ -0,0 +1,29 @@
+from django import template
+from django.conf import settings
+
+from posts.models import FollowSuggestion
+
+register = template.Library()
+
+
+@register.inclusion_tag(
+    'posts/includes/follow_suggestions.html', takes_context=True
+)
+def follow_suggestions(context):
+    """Рекомендации, на кого подписаться: один запрос по индексу
+    (user, -score)."""
+    user = context['user']
+    if not user.is_authenticated:
+        return {}
+    suggestions = FollowSuggestion.objects.filter(user=user).select_related(
+        'suggested'
+    ).only(
+        'suggested', 'mutual_follows', 'shared_posts',
+        'suggested__username', 'suggested__first_name',
+        'suggested__last_name',
+    ).order_by('-score', 'suggested')[:settings.SUGGESTIONS_SHOWN]
+    # Форме подписки нужен CSRF-токен страницы.
+    return {
+        'suggestions': suggestions,
+        'csrf_token': context.get('csrf_token'),
+    }
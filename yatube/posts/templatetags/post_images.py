@@ -0,0 +1,44 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+SIZES = '(min-width: 960px) 960px, 100vw'
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, rendition='feed'):
+    """Миниатюра картинки поста со srcset, а пока её нет — исходная
+    картинка."""
+    if not post.image:
+        return {}
+    thumbnail = thumbnails.cached(post.image, rendition)
+    if thumbnail is None:
+        thumbnails.schedule(post.image.name)
+        return {
+            'src': post.image.url,
+            'pending': True,
+            'width': post.image_width,
+            'height': post.image_height,
+        }
+    srcset = {}
+    for name in thumbnails.SRCSETS.get(rendition, ()):
+        candidate = thumbnails.cached(post.image, name)
+        if candidate is None:
+            thumbnails.schedule(post.image.name)
+            break
+        # Маленький оригинал не увеличивается, и несколько ширин могут
+        # дать одну и ту же миниатюру.
+        srcset.setdefault(candidate.width, candidate.url)
+    return {
+        'src': thumbnail.url,
+        # Размеры миниатюры sorl-thumbnail хранит в kvstore.
+        'width': thumbnail.width,
+        'height': thumbnail.height,
+        'srcset': ', '.join(
+            f'{url} {width}w' for width, url in sorted(srcset.items())
+        ),
+        'srcset_type': f'image/{thumbnails.SRCSET_FORMAT.lower()}',
+        'sizes': SIZES,
+    }
@@ -1,12 +1,21 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.models import Comment, Group, Post, User
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 NEW_TEXT = 'Новый пост'
 UPDATED_TEXT = 'Обновленный текст'
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -23,6 +32,11 @@ class PostFormTests(TestCase):
             text='Текст тестового поста'
         )
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(PostFormTests.user)
@@ -90,6 +104,95 @@ class PostFormTests(TestCase):
                 'posts:profile',
                 args=[PostFormTests.user.username])
         )
+        self.assertTrue(
+            Post.objects.filter(image='posts/small.gif').exists()
+        )
+
+
+def image_upload(name, image_format, size=(300, 200), mode='RGB',
+                 **options):
+    content = BytesIO()
+    Image.new(mode, size, 'red').save(content, image_format, **options)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   IMAGE_MAX_SIDE=100)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Картинка', 'image': image},
+        )
+
+    def test_downsampled_rotated_and_stripped(self):
+        """Большая картинка уменьшается, поворачивается по EXIF, теряет
+        метаданные, а размеры записываются в пост."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90° по часовой.
+        exif[0x010F] = 'Camera'  # Make.
+        self.create(image_upload('photo.jpg', 'JPEG', exif=exif.tobytes()))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        self.assertEqual((post.image_width, post.image_height), (67, 100))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (67, 100))
+            self.assertEqual(dict(stored.getexif()), {})
+
+    def test_unknown_format_converted(self):
+        """TIFF с прозрачностью сохраняется в PNG."""
+        self.create(image_upload('scan.tiff', 'TIFF', (50, 40), 'RGBA'))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/scan.png')
+        self.assertEqual((post.image_width, post.image_height), (50, 40))
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_too_large_file_rejected(self):
+        response = self.create(image_upload('big.png', 'PNG'))
+        self.assertEqual(Post.objects.count(), 0)
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'file_too_large'
+        ))
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        response = self.create(image_upload('wide.png', 'PNG'))
+        self.assertEqual(Post.objects.count(), 0)
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'too_many_pixels'
+        ))
+
+    def test_edit_keeps_and_clears_size(self):
+        """Правка без новой картинки сохраняет размеры, очистка — стирает."""
+        self.create(image_upload('keep.png', 'PNG', (80, 60)))
+        post = Post.objects.get()
+        address = reverse('posts:post_edit', args=[post.pk])
+        self.client.post(address, {'text': 'Новый текст'})
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (80, 60))
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertContains(response, 'width="80" height="60"')
+        self.client.post(
+            address, {'text': 'Без картинки', 'image-clear': 'on'}
+        )
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertIsNone(post.image_width)
 
 
 class CommentTest(TestCase):
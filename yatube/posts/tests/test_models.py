@@ -1,6 +1,9 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase
-from posts.models import Group, Post
+from posts.models import Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -55,3 +58,60 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         expected_object_group = group.title
         self.assertEqual(expected_object_group, str(group))
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+
+    def posts_count(self, user):
+        return UserStats.objects.get(user=user).posts_count
+
+    def test_counter_follows_create_delete_and_reassign(self):
+        """Счётчик постов меняется при создании, удалении и смене автора."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.create(author=self.user, text='Ещё пост')
+        self.assertEqual(self.posts_count(self.user), 2)
+
+        post = Post.objects.get(pk=post.pk)
+        post.author = self.other
+        post.save()
+        self.assertEqual(self.posts_count(self.user), 1)
+        self.assertEqual(self.posts_count(self.other), 1)
+
+        post.delete()
+        self.assertEqual(self.posts_count(self.other), 0)
+
+    def test_rebuild_command_fixes_counters(self):
+        """Команда rebuild_user_stats находит и чинит расхождения."""
+        Post.objects.create(author=self.user, text='Пост')
+        UserStats.objects.filter(user=self.user).update(posts_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_user_stats', verify=True,
+                         stdout=StringIO())
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(self.posts_count(self.user), 1)
+        call_command('rebuild_user_stats', verify=True, stdout=StringIO())
+
+    def test_follow_counters(self):
+        """Подписка меняет счётчики подписчиков автора и подписок
+        пользователя, rebuild_user_stats их пересчитывает."""
+        follow = Follow.objects.create(user=self.user, author=self.other)
+        self.assertEqual(
+            UserStats.objects.get(user=self.other).followers_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1
+        )
+        UserStats.objects.filter(user=self.user).update(following_count=3)
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1
+        )
+        follow.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 0
+        )
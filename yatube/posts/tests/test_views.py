@@ -1,23 +1,42 @@
+import json
+import os
 import shutil
 import tempfile
+import time
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
+from xml.etree import ElementTree
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
+from django.shortcuts import render
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Follow, Group, Post
+from PIL import Image
+from core import metrics, replicas
+from posts import benchmarks, feed_cache, thumbnails, timeline
+from posts.management.commands.explain_feeds import (
+    feed_queries, full_scans
+)
+from posts.models import (
+    Comment, Follow, FollowSuggestion, Group, LastModified, Post,
+    StoredImage, TimelineEntry, UserStats
+)
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostPagesTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -168,14 +187,284 @@ class PostPagesTest(TestCase):
         self.assertEqual(response_post.image, PostPagesTest.post.image)
 
     def test_index_page_cache(self):
-        """Проверка работы кэша на странице index."""
+        """Страница index берётся из кэша до изменения постов."""
         page_1 = self.guest_client.get(reverse('posts:index')).content
-        Post.objects.create(text='Текст', author=self.author)
+        Post.objects.filter(pk=PostPagesTest.post.pk).update(
+            text='Изменено в обход сигналов'
+        )
         page_2 = self.guest_client.get(reverse('posts:index')).content
         self.assertEqual(page_1, page_2)
-        cache.clear()
+        Post.objects.create(text='Текст', author=self.author)
         page_3 = self.guest_client.get(reverse('posts:index')).content
         self.assertNotEqual(page_1, page_3)
+        cache.clear()
+        page_4 = self.guest_client.get(reverse('posts:index')).content
+        self.assertIn('Изменено в обход сигналов', page_4.decode())
+
+    def test_feed_cache_follows_group_change(self):
+        """Смена группы поста сразу видна в лентах обеих групп."""
+        new_group = Group.objects.create(
+            title='new_group', slug='new-slug', description='-'
+        )
+        old_url = reverse('posts:group_list', args=[PostPagesTest.group.slug])
+        new_url = reverse('posts:group_list', args=[new_group.slug])
+        profile_url = reverse('posts:profile', args=[self.author.username])
+        for url in (old_url, new_url, profile_url):
+            self.guest_client.get(url)
+
+        post = Post.objects.get(pk=PostPagesTest.post.pk)
+        post.group = new_group
+        post.text = 'Пост в новой группе'
+        post.save()
+
+        self.assertNotContains(self.guest_client.get(old_url), post.text)
+        self.assertContains(self.guest_client.get(new_url), post.text)
+        self.assertContains(self.guest_client.get(profile_url), post.text)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(
+            text='test_post',
+            author=cls.author,
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00'
+                    b'\x00\x21\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00'
+                    b'\x00\x00\x01\x00\x01\x00\x00\x02\x01\x00\x00\x3b'
+                ),
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_original_is_shown_until_thumbnail_exists(self):
+        """Пока миниатюры нет, показывается исходная картинка,
+        а миниатюра ставится в очередь."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.client.get(url)
+        schedule.assert_called_once_with(self.post.image.name)
+        self.assertContains(response, self.post.image.url)
+
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.cached(self.post.image, 'feed')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(url)
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_generation_refreshes_cached_feeds(self):
+        """Готовая миниатюра сразу появляется в закэшированной ленте."""
+        with mock.patch.object(thumbnails, 'schedule'):
+            self.client.get(reverse('posts:index'))
+        thumbnails.generate(self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, thumbnails.cached(self.post.image, 'feed').url
+        )
+
+    def test_srcset_lists_renditions(self):
+        """Готовые миниатюры разных ширин попадают в srcset."""
+        content = BytesIO()
+        Image.new('RGB', (1600, 600)).save(content, 'PNG')
+        post = Post.objects.create(
+            text='wide', author=self.author,
+            image=SimpleUploadedFile(
+                'wide.png', content.getvalue(), 'image/png'
+            ),
+        )
+        thumbnails.generate(post.image.name)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        for name in thumbnails.SRCSETS['feed']:
+            thumbnail = thumbnails.cached(post.image, name)
+            self.assertContains(
+                response, f'{thumbnail.url} {thumbnail.width}w'
+            )
+        self.assertContains(
+            response, f'image/{thumbnails.SRCSET_FORMAT.lower()}'
+        )
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    @mock.patch.object(thumbnails, '_use_workers', return_value=True)
+    def test_schedule_runs_in_pool_once_per_image(self, _):
+        """Картинка ставится в очередь пула один раз."""
+        with mock.patch.object(thumbnails, 'generate') as generate:
+            future = thumbnails.schedule('posts/other.gif')
+            self.assertIsNone(thumbnails.schedule('posts/other.gif'))
+            future.result()
+        generate.assert_called_once_with('posts/other.gif')
+        thumbnails._pending.discard('posts/other.gif')
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    @mock.patch.object(thumbnails, '_use_workers', return_value=True)
+    def test_scheduled_images_are_counted_in_request(self, _):
+        """Метрика thumbnails считает картинки, которые запрос поставил
+        в очередь, хотя миниатюры создаются в потоке пула."""
+        token = metrics.start()
+        with mock.patch.object(thumbnails, 'generate'):
+            thumbnails.schedule('posts/counted.gif').result()
+        self.assertEqual(metrics.finish(token)['thumbnails'], 1)
+        thumbnails._pending.discard('posts/counted.gif')
+
+    def test_warm_and_gc_command(self):
+        """warm создаёт недостающие миниатюры, gc удаляет миниатюры
+        картинок, которых нет ни у одного поста."""
+        # Картинка должна отличаться: одинаковые хранятся одним файлом.
+        content = BytesIO()
+        Image.new('RGB', (2, 2), 'red').save(content, 'GIF')
+        orphan = Post.objects.create(
+            text='orphan', author=self.author,
+            image=SimpleUploadedFile(
+                'orphan.gif', content.getvalue(), 'image/gif'
+            ),
+        )
+        call_command('thumbnails', 'warm', processes=0, stdout=StringIO())
+        live = thumbnails.cached(self.post.image, 'feed')
+        stale = thumbnails.cached(orphan.image, 'feed')
+        self.assertIsNotNone(live)
+        self.assertIsNotNone(stale)
+        stray = os.path.join(TEMP_MEDIA_ROOT, 'cache', 'ab', 'stray.jpg')
+        os.makedirs(os.path.dirname(stray), exist_ok=True)
+        with open(stray, 'wb') as file:
+            file.write(b'x' * 10)
+        hour_ago = time.time() - 60 * 60 - 1
+        os.utime(stray, (hour_ago, hour_ago))
+        # Только что созданный файл ещё может попасть в хранилище.
+        fresh = os.path.join(TEMP_MEDIA_ROOT, 'cache', 'ab', 'fresh.jpg')
+        with open(fresh, 'wb') as file:
+            file.write(b'x' * 10)
+
+        orphan.delete()
+        call_command('thumbnails', 'gc', dry_run=True, stdout=StringIO())
+        self.assertTrue(stale.exists())
+        call_command('thumbnails', 'gc', stdout=StringIO())
+        self.assertFalse(stale.exists())
+        self.assertFalse(os.path.exists(stray))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(live.exists())
+        self.assertIsNone(thumbnails.cached(orphan.image, 'feed'))
+        self.assertIsNotNone(thumbnails.cached(self.post.image, 'feed'))
+
+
+def gif(color):
+    content = BytesIO()
+    Image.new('RGB', (2, 2), color).save(content, 'GIF')
+    return content.getvalue()
+
+
+# Файлы удаляются после фиксации транзакции, которой в TestCase нет.
+@mock.patch.object(transaction, 'on_commit', lambda func: func())
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='storage_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name, content):
+        return Post.objects.create(
+            text=name, author=self.author,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def test_identical_images_share_file_and_thumbnails(self):
+        """Одинаковые картинки хранятся одним файлом с общими
+        миниатюрами."""
+        first = self.create_post('first.gif', gif('blue'))
+        second = self.create_post('second.gif', gif('blue'))
+        other = self.create_post('other.gif', gif('green'))
+
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertNotEqual(other.image.name, first.image.name)
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, 'posts/second.gif'))
+        )
+        self.assertEqual(
+            StoredImage.objects.get(name=first.image.name).refs, 2
+        )
+        thumbnails.generate(first.image.name)
+        self.assertEqual(
+            thumbnails.cached(second.image, 'feed').url,
+            thumbnails.cached(first.image, 'feed').url,
+        )
+
+    def test_file_is_removed_with_last_reference(self):
+        """Файл и миниатюры удаляются, когда на картинку не ссылается
+        ни один пост."""
+        first = self.create_post('shared.gif', gif('yellow'))
+        second = self.create_post('shared.gif', gif('yellow'))
+        name = first.image.name
+        path = first.image.path
+        thumbnails.generate(name)
+        thumbnail = thumbnails.cached(first.image, 'feed')
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(StoredImage.objects.get(name=name).refs, 1)
+
+        second = Post.objects.get(pk=second.pk)
+        second.image = SimpleUploadedFile('again.gif', gif('yellow'))
+        second.save()
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(StoredImage.objects.get(name=name).refs, 1)
+
+        second.image = SimpleUploadedFile('new.gif', gif('black'))
+        second.save()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(thumbnail.exists())
+        self.assertFalse(StoredImage.objects.filter(name=name).exists())
+        self.assertEqual(
+            StoredImage.objects.get(name=second.image.name).refs, 1
+        )
+
+    def test_dedupe_command(self):
+        """dedupe_images объединяет одинаковые файлы, загруженные до
+        хранилища, и пересчитывает ссылки."""
+        directory = os.path.join(TEMP_MEDIA_ROOT, 'posts')
+        os.makedirs(directory, exist_ok=True)
+        names = ['posts/old.gif', 'posts/old_a1b2c3.gif', 'posts/lone.gif']
+        for name, color in zip(names, ('white', 'white', 'gray')):
+            with open(os.path.join(TEMP_MEDIA_ROOT, name), 'wb') as file:
+                file.write(gif(color))
+        Post.objects.bulk_create(
+            Post(text=name, author=self.author, image=name)
+            for name in names + names[1:2]
+        )
+
+        call_command('dedupe_images', dry_run=True, stdout=StringIO())
+        self.assertTrue(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, names[1]))
+        )
+        call_command('dedupe_images', stdout=StringIO())
+
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, names[1]))
+        )
+        self.assertFalse(Post.objects.filter(image=names[1]).exists())
+        self.assertEqual(StoredImage.objects.get(name=names[0]).refs, 3)
+        self.assertEqual(StoredImage.objects.get(name=names[2]).refs, 1)
+        post = self.create_post('copy.gif', gif('gray'))
+        self.assertEqual(post.image.name, names[2])
 
 
 class PaginatorViewsTest(TestCase):
@@ -221,6 +510,222 @@ class PaginatorViewsTest(TestCase):
                     'page_obj'
                 ).object_list), 3)
 
+    @override_settings(ITEMS_COUNT=1)
+    def test_page_range_is_elided(self):
+        """Ссылки есть только на страницы вокруг текущей и по краям."""
+        cache.clear()
+        for address in PaginatorViewsTest.templates:
+            with self.subTest(address=address):
+                response = self.client.get(address + '?page=7')
+                self.assertEqual(
+                    response.context['page_obj'].elided_page_range,
+                    [1, '…', 5, 6, 7, 8, 9, '…', 13]
+                )
+                self.assertContains(response, '?page=13"')
+                self.assertNotContains(response, '?page=3"')
+                self.assertContains(
+                    response, '<span class="page-link">…</span>', count=2
+                )
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test-slug',
+            description='test_description'
+        )
+        for i in range(13):
+            Post.objects.create(
+                text=f'test_post{i}',
+                group=cls.group,
+                author=cls.author
+            )
+        # Одинаковая дата у всех постов: порядок держится на id.
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+        cls.addresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.author.username]),
+            reverse('posts:follow_index'),
+        ]
+
+    def setUp(self):
+        self.client.force_login(CursorPaginatorViewsTest.reader)
+
+    def test_cursor_pages_walk_through_all_posts(self):
+        """Курсорные страницы вперёд и назад без пропусков и повторов."""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+        for address in CursorPaginatorViewsTest.addresses:
+            with self.subTest(address=address):
+                first = self.client.get(address + '?cursor=')
+                page_obj = first.context['page_obj']
+                self.assertTrue(page_obj.is_cursor)
+                self.assertFalse(page_obj.has_previous())
+                self.assertEqual(len(page_obj), settings.ITEMS_COUNT)
+
+                second = self.client.get(
+                    address + f'?cursor={page_obj.next_cursor}'
+                ).context['page_obj']
+                self.assertFalse(second.has_next())
+                self.assertEqual(
+                    [post.pk for post in page_obj]
+                    + [post.pk for post in second],
+                    expected
+                )
+
+                back = self.client.get(
+                    address + f'?cursor={second.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(
+                    [post.pk for post in back],
+                    [post.pk for post in page_obj]
+                )
+
+    @override_settings(FEED_PAGINATION='cursor')
+    def test_cursor_mode_from_settings(self):
+        """FEED_PAGINATION='cursor' включает курсоры без параметра."""
+        response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_cursor)
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+        self.assertNotContains(response, '?page=')
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.client.get(reverse('posts:index') + '?cursor=%%%')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class FeedQueryCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test-slug',
+            description='test_description'
+        )
+        for i in range(10):
+            author = User.objects.create_user(
+                username=f'author_{i}', first_name='Имя', last_name=str(i)
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            group = cls.group
+            if i:
+                group = Group.objects.create(
+                    title=f'group_{i}', slug=f'group-{i}', description='-'
+                )
+            Post.objects.create(text=f'test_post{i}', group=group,
+                                author=author)
+        cls.solo_author = author
+        for i in range(9):
+            Post.objects.create(text=f'more_{i}', group=cls.group,
+                                author=cls.solo_author)
+
+    def setUp(self):
+        self.client.force_login(FeedQueryCountTest.reader)
+
+    def count_queries(self, address):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(address)
+        return len(queries)
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Число запросов ленты не растёт с числом постов на странице."""
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[FeedQueryCountTest.group.slug]),
+            reverse('posts:profile',
+                    args=[FeedQueryCountTest.solo_author.username]),
+            reverse('posts:follow_index'),
+        ]
+        for address in addresses:
+            with self.subTest(address=address):
+                with override_settings(ITEMS_COUNT=2):
+                    small_page = self.count_queries(address)
+                with override_settings(ITEMS_COUNT=10):
+                    full_page = self.count_queries(address)
+                self.assertEqual(small_page, full_page)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не читают таблицы целиком и не сортируют без
+        индекса."""
+        call_command('explain_feeds', check=True, stdout=StringIO())
+        plans = feed_queries(
+            post_id=Post.objects.first().pk,
+            user_id=FeedQueryCountTest.reader.pk,
+            group_id=FeedQueryCountTest.group.pk,
+        )
+        for name, queryset in plans.items():
+            with self.subTest(query=name):
+                self.assertEqual(full_scans(queryset.explain()), [])
+        self.assertTrue(full_scans('2 0 0 SCAN posts_post'))
+
+
+@override_settings(COMMENTS_COUNT=5)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(text='test_post', author=cls.author)
+        for i in range(7):
+            commenter = User.objects.create_user(username=f'commenter_{i}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'comment_{i}'
+            )
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста только первая порция комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'comment_{i}' for i in range(5)]
+        )
+        self.assertContains(response, comments.next_cursor)
+
+    def test_comments_fragment_returns_next_batch(self):
+        """Фрагмент комментариев отдаёт следующую порцию."""
+        first = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'cursor': first.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['comment_5', 'comment_6']
+        )
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_comments_query_count_is_constant(self):
+        """Авторы комментариев не запрашиваются по одному."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        with override_settings(COMMENTS_COUNT=2):
+            with CaptureQueriesContext(connection) as small_batch:
+                self.client.get(url)
+        with CaptureQueriesContext(connection) as full_batch:
+            self.client.get(url)
+        self.assertEqual(len(small_batch), len(full_batch))
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -247,6 +752,21 @@ class FollowTest(TestCase):
             user=self.user, author=self.author).exists()
         self.assertEqual(follow, True)
 
+    @override_settings(REPLICA_DATABASES=['default'])
+    def test_follow_pins_reads_to_primary(self):
+        """Подписка и отписка по GET-ссылке ставят куку чтения с
+        основной базы, как запросы POST."""
+        client = Client()
+        client.force_login(self.user)
+        profile = client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertNotIn(replicas.PIN_COOKIE, profile.cookies)
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            client.cookies.pop(replicas.PIN_COOKIE, None)
+            response = client.get(reverse(name, args=[self.author.username]))
+            self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
     def test_not_authorized_client_cannot_follow(self):
         """Неавторизованный пользователь не может подписываться."""
         response = self.guest_client.get(
@@ -329,6 +849,703 @@ class FollowTest(TestCase):
         self.assertEqual(count, 0)
 
 
+class FollowListTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='star')
+        cls.fans = [
+            User.objects.create_user(username=f'fan{number}')
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_follow_and_unfollow(self):
+        """Счётчики подписчиков и подписок в профиле меняются при
+        подписке и отписке."""
+        client = Client()
+        client.force_login(self.fans[0])
+        profile_url = reverse('posts:profile', args=[self.author.username])
+        etag = client.get(profile_url)['ETag']
+
+        client.get(reverse('posts:profile_follow', args=['star']))
+        response = client.get(profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.context['stats'].followers_count, 1)
+        self.assertContains(response, 'Подписчиков: 1')
+        response = client.get(reverse('posts:profile', args=['fan0']))
+        self.assertEqual(response.context['stats'].following_count, 1)
+
+        client.get(reverse('posts:profile_unfollow', args=['star']))
+        response = client.get(profile_url)
+        self.assertEqual(response.context['stats'].followers_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.fans[0]).following_count, 0
+        )
+
+    @override_settings(FOLLOWS_COUNT=2)
+    def test_lists_are_cursor_paginated(self):
+        """Списки подписчиков и подписок выводятся курсором, новые
+        сначала, одинаковым числом запросов на любой странице."""
+        for fan in self.fans:
+            Follow.objects.create(user=fan, author=self.author)
+        url = reverse('posts:followers', args=[self.author.username])
+        pages = []
+        cursor = ''
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(url)
+        while True:
+            pages.append([user.username for user in response.context[
+                'page_obj'
+            ]])
+            cursor = response.context['page_obj'].next_cursor
+            if cursor is None:
+                break
+            with CaptureQueriesContext(connection) as next_page:
+                response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(len(next_page), len(first_page))
+        self.assertEqual(
+            pages, [['fan4', 'fan3'], ['fan2', 'fan1'], ['fan0']]
+        )
+        response = self.client.get(
+            reverse('posts:following', args=['fan2'])
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.author])
+        self.assertContains(response, 'Подписок: 1')
+
+
+class FollowManyTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'writer{number}')
+            for number in range(3)
+        ]
+        for author in cls.authors:
+            Post.objects.create(text=f'Пост {author.username}', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post_authors(self, name, authors):
+        return self.client.post(reverse(f'posts:{name}'), {
+            'authors': [author.username for author in authors]
+        })
+
+    def test_follow_and_unfollow_many(self):
+        """Подписка и отписка пачкой меняют подписки, счётчики и ленту
+        так же, как по одной."""
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        response = self.post_authors('follow_many', self.authors)
+        self.assertRedirects(response, reverse('posts:follow_index'))
+        self.assertEqual(
+            Follow.objects.filter(user=self.user).count(), 3
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3
+        )
+        call_command('rebuild_user_stats', verify=True, stdout=StringIO())
+
+        self.post_authors('unfollow_many', self.authors[:2])
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.user).values_list(
+                'author', flat=True
+            )),
+            [self.authors[2].pk],
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).values_list(
+                'author', flat=True
+            )),
+            [self.authors[2].pk],
+        )
+        call_command('rebuild_user_stats', verify=True, stdout=StringIO())
+
+    @override_settings(FOLLOWS_BATCH_LIMIT=2)
+    def test_invalid_requests_are_rejected(self):
+        """Больше FOLLOWS_BATCH_LIMIT авторов или неизвестный автор —
+        ошибка 400 без изменений."""
+        response = self.post_authors('follow_many', self.authors)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.post(reverse('posts:follow_many'), {
+            'authors': ['writer0', 'nobody']
+        })
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+
+    def test_suggestions(self):
+        """Рекомендуются авторы подписок подписок и соседи по
+        комментариям, кроме себя и тех, на кого уже подписан."""
+        first, second, third = self.authors
+        Follow.objects.create(user=self.user, author=first)
+        Follow.objects.create(user=first, author=second)
+        Follow.objects.create(user=first, author=self.user)
+        post = Post.objects.get(author=first)
+        Comment.objects.create(post=post, author=self.user, text='Да')
+        Comment.objects.create(post=post, author=third, text='Нет')
+        Comment.objects.create(post=post, author=first, text='Спасибо')
+        call_command('rebuild_follow_suggestions', stdout=StringIO())
+        suggestions = FollowSuggestion.objects.filter(user=self.user)
+        self.assertEqual(
+            list(suggestions.order_by('-score').values_list(
+                'suggested__username', 'mutual_follows', 'shared_posts'
+            )),
+            [('writer1', 1, 0), ('writer2', 0, 1)],
+        )
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, reverse('posts:follow_many'))
+        self.assertContains(response, 'value="writer1"')
+        widget = [
+            query for query in captured.captured_queries
+            if 'posts_followsuggestion' in query['sql']
+        ]
+        self.assertEqual(len(widget), 1)
+
+        self.client.get(reverse('posts:profile_follow', args=['writer1']))
+        self.post_authors('follow_many', [third])
+        self.assertFalse(suggestions.exists())
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.author = User.objects.create_user(username='Irina')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(TimelineTest.user)
+
+    def feed_texts(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_timeline_is_filled_on_follow_and_post(self):
+        """Подписка добавляет старые посты, публикация — новые,
+        отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='Новый пост', author=self.author)
+        entries = TimelineEntry.objects.filter(user=self.user)
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(self.feed_texts(), ['Новый пост', 'Старый пост'])
+
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertFalse(entries.exists())
+        self.assertEqual(self.feed_texts(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        """Посты авторов с большим числом подписчиков не раскладываются,
+        а подмешиваются в ленту при чтении."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.create(
+            user=self.user, post=Post.objects.create(text='Обычный пост',
+                                                     author=other),
+            author=other, pub_date=TimelineTest.old_post.pub_date
+        )
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(author=self.author).count(), 0
+        )
+        self.assertEqual(
+            self.feed_texts(), ['Новый пост', 'Обычный пост', 'Старый пост']
+        )
+
+    def test_reassigned_post_moves_to_new_author_followers(self):
+        """Пост, сменивший автора, уходит из лент подписчиков старого
+        автора и попадает к подписчикам нового."""
+        new_author = User.objects.create_user(username='new_author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=new_author, author=self.author)
+        Follow.objects.create(user=reader, author=new_author)
+        post = Post.objects.create(text='Переданный пост', author=self.author)
+
+        post.author = new_author
+        post.save()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post=post).values_list(
+                'user__username', 'author__username'
+            )),
+            {('reader', 'new_author')},
+        )
+        self.assertEqual(self.feed_texts(), ['Старый пост'])
+
+    @mock.patch.object(timeline, 'BATCH_SIZE', 1)
+    def test_rebuild_by_batches(self):
+        """rebuild_timelines пересобирает ленты пачками пользователей."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.author, author=self.user)
+        Post.objects.create(text='Пост читателя', author=self.user)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_texts(), ['Старый пост'])
+        self.assertEqual(
+            list(self.author.timeline.values_list('post__text', flat=True)),
+            ['Пост читателя'],
+        )
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Irina')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='test_group', slug='test-slug',
+            description='test_description'
+        )
+        cls.best = Post.objects.create(
+            text='Ёжик ёжик ёжик в тумане', author=cls.author,
+            group=cls.group
+        )
+        cls.weak = Post.objects.create(
+            text='Длинный рассказ про лес, реку, туман и одного ежика',
+            author=cls.other
+        )
+        Post.objects.create(text='Про котов', author=cls.author)
+
+    def found(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return [post.text for post in response.context['page_obj']]
+
+    def test_search_ranks_and_filters(self):
+        """Лучшее совпадение первое, фильтры по группе и автору."""
+        self.assertEqual(
+            self.found(q='ежик'), [self.best.text, self.weak.text]
+        )
+        self.assertEqual(
+            self.found(q='ежик', group=self.group.slug), [self.best.text]
+        )
+        self.assertEqual(
+            self.found(q='ежик', author=self.other.username),
+            [self.weak.text]
+        )
+        self.assertEqual(self.found(q='туман лес'), [self.weak.text])
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.create(text='Про собак', author=self.author)
+        self.assertEqual(self.found(q='собак'), [post.text])
+        post.text = 'Про попугаев'
+        post.save()
+        self.assertEqual(self.found(q='собак'), [])
+        self.assertEqual(self.found(q='попуга'), [post.text])
+        post.delete()
+        self.assertEqual(self.found(q='попуга'), [])
+
+    @override_settings(ITEMS_COUNT=1)
+    def test_pagination_keeps_query(self):
+        """Ссылки на страницы сохраняют параметры поиска."""
+        response = self.client.get(reverse('posts:search'), {'q': 'ежик'})
+        self.assertContains(response, '?q=%D0%B5%D0%B6%D0%B8%D0%BA&amp;page=2')
+
+    def test_admin_uses_search_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'ежик'}
+        )
+        self.assertEqual(
+            {post.pk for post in response.context['cl'].result_list},
+            {self.best.pk, self.weak.pk}
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_measure_and_compare(self):
+        """Замер проходит по всем страницам, регрессии по числу
+        запросов находятся точно, по времени — с порогом."""
+        benchmarks.seed(users=5, groups=2, posts=30, comments=20,
+                        follows=10)
+        results = benchmarks.measure(requests=2)
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'followers', 'index_feed', 'post_create',
+            'add_comment',
+        })
+        self.assertEqual(benchmarks.compare(results, results, 0), [])
+        baselines = {'index': dict(
+            results['index'],
+            queries=results['index']['queries'] - 1,
+            p95_ms=results['index']['p95_ms'] / 1.4,
+        )}
+        regressions = benchmarks.compare(results, baselines, 0.5)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('index: queries'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class TransferTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_export_import_round_trip(self):
+        """Выгрузка загружается в пустую базу с теми же id, датами и
+        картинками, а производные данные пересобираются."""
+        author = User.objects.create_user(username='author', first_name='A')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        post = Post.objects.create(
+            text='Перенесённый пост', author=author, group=group,
+            image=SimpleUploadedFile('small.gif', small_gif, 'image/gif'),
+        )
+        comment = Comment.objects.create(
+            post=post, author=reader, text='Комментарий'
+        )
+        Follow.objects.create(user=reader, author=author)
+        post.refresh_from_db()
+        image = post.image.name
+        call_command('export_posts', self.directory, stdout=StringIO())
+
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        post.image.storage.delete(image)
+        output = StringIO()
+        call_command('import_posts', self.directory, stdout=output)
+        self.assertIn('строк/с', output.getvalue())
+
+        imported = Post.objects.get(pk=post.pk)
+        self.assertEqual(imported.text, post.text)
+        self.assertEqual(imported.pub_date, post.pub_date)
+        self.assertEqual(imported.author.first_name, 'A')
+        self.assertEqual(imported.group.slug, group.slug)
+        self.assertEqual(imported.image.name, image)
+        self.assertTrue(imported.image.storage.exists(image))
+        self.assertEqual(
+            Comment.objects.get(pk=comment.pk).created, comment.created
+        )
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertTrue(Follow.objects.filter(
+            user=reader, author=imported.author
+        ).exists())
+        self.assertEqual(imported.author.stats.posts_count, 1)
+        self.assertTrue(reader.timeline.filter(post=imported).exists())
+        response = self.client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+        call_command('import_posts', self.directory, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_import_remaps_taken_ids(self):
+        """Пост с занятым в базе id загружается под новым id, и его
+        комментарии попадают к нему, а не к чужому посту."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(text='Перенесённый пост', author=author)
+        comment = Comment.objects.create(
+            post=post, author=author, text='Комментарий'
+        )
+        call_command('export_posts', self.directory, stdout=StringIO())
+        Post.objects.all().delete()
+        other = User.objects.create_user(username='other')
+        unrelated = Post.objects.create(
+            pk=post.pk, text='Чужой пост', author=other
+        )
+        Comment.objects.create(
+            pk=comment.pk, post=unrelated, author=other, text='Чужой'
+        )
+
+        for _ in range(2):
+            call_command(
+                'import_posts', self.directory, skip_rebuild=True,
+                stdout=StringIO(),
+            )
+            imported = Post.objects.get(text='Перенесённый пост')
+            self.assertNotEqual(imported.pk, unrelated.pk)
+            self.assertEqual(
+                list(imported.comments.values_list('text', flat=True)),
+                ['Комментарий'],
+            )
+            self.assertEqual(
+                list(unrelated.comments.values_list('text', flat=True)),
+                ['Чужой'],
+            )
+            self.assertEqual(Post.objects.count(), 2)
+
+
+class FeedsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Ирина'
+        )
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number} <b>&</b>', author=cls.author,
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+        Post.objects.create(text='Чужой пост', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+
+    def read(self, response):
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(FEEDS_ITEMS_COUNT=4)
+    def test_json_feed_pages_with_cursor(self):
+        """JSON Feed отдаётся страницами по курсору без моделей."""
+        address = reverse('posts:index_feed', args=['json'])
+        with mock.patch.object(Post, 'from_db') as from_db:
+            response = self.client.get(address)
+            feed = json.loads(self.read(response))
+        from_db.assert_not_called()
+        self.assertEqual(
+            response['Content-Type'], 'application/feed+json; charset=utf-8'
+        )
+        self.assertEqual(len(feed['items']), 4)
+        self.assertEqual(feed['items'][0]['content_text'], 'Чужой пост')
+        self.assertEqual(feed['items'][1]['authors'][0]['name'], 'Ирина')
+        self.assertEqual(feed['items'][1]['tags'], [])
+        self.assertEqual(feed['items'][2]['tags'], ['Группа'])
+        rest = json.loads(self.read(self.client.get(feed['next_url'])))
+        self.assertNotIn('next_url', rest)
+        self.assertEqual(
+            [item['id'] for item in feed['items'] + rest['items']],
+            [
+                'http://testserver' + reverse(
+                    'posts:post_detail', args=[post.pk]
+                )
+                for post in Post.objects.order_by('-pub_date', '-pk')
+            ],
+        )
+
+    def test_rss_and_atom_feeds(self):
+        """Группа и профиль отдают только свои посты, текст экранирован."""
+        namespaces = {'atom': 'http://www.w3.org/2005/Atom'}
+        rss = ElementTree.fromstring(self.read(self.client.get(
+            reverse('posts:group_feed', args=[self.group.slug, 'rss'])
+        )))
+        items = rss.findall('channel/item')
+        self.assertEqual(len(items), 2)
+        self.assertEqual(items[0].find('description').text, 'Пост 3 <b>&</b>')
+        atom = ElementTree.fromstring(self.read(self.client.get(
+            reverse('posts:profile_feed', args=[self.author.username, 'atom'])
+        )))
+        entries = atom.findall('atom:entry', namespaces)
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(
+            entries[-1].find('atom:content', namespaces).text,
+            'Пост 0 <b>&</b>',
+        )
+
+    def test_feed_errors(self):
+        addresses = {
+            reverse('posts:index_feed', args=['json']) + '?cursor=bad':
+                HTTPStatus.BAD_REQUEST,
+            '/feed.xml': HTTPStatus.NOT_FOUND,
+            reverse('posts:group_feed', args=['missing', 'rss']):
+                HTTPStatus.NOT_FOUND,
+        }
+        for address, status in addresses.items():
+            with self.subTest(address=address):
+                self.assertEqual(
+                    self.client.get(address).status_code, status
+                )
+
+    def test_feed_is_cacheable(self):
+        """Лента публичная, с ETag, и тот же ETag у любого пользователя."""
+        address = reverse('posts:index_feed', args=['atom'])
+        response = self.client.get(address)
+        self.assertIn('public', response['Cache-Control'])
+        self.client.force_login(self.other)
+        response = self.client.get(
+            address, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertIn('public', response['Cache-Control'])
+        Post.objects.create(text='Новый пост', author=self.other)
+        response = self.client.get(
+            address, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Irina')
+        cls.group = Group.objects.create(
+            title='test_group', slug='test-slug',
+            description='test_description'
+        )
+        cls.post = Post.objects.create(
+            text='test_post', author=cls.author, group=cls.group
+        )
+        cls.addresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.author.username]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, address):
+        response = self.client.get(address)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.has_header('Last-Modified'))
+        return self.client.get(address, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_pages_are_always_revalidated(self):
+        """Страницы с ETag не кэшируются браузером без проверки."""
+        addresses = [
+            *ConditionalGetTest.addresses,
+            reverse('posts:followers', args=[self.author.username]),
+            reverse('posts:following', args=[self.author.username]),
+        ]
+        for address in addresses:
+            with self.subTest(address=address):
+                response = self.client.get(address)
+                cache_control = response['Cache-Control']
+                self.assertIn('no-cache', cache_control)
+                self.assertIn('private', cache_control)
+                response = self.client.get(
+                    address, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_replica_reads_use_replica_generations(self):
+        """При чтении с реплики ключ и ETag зависят от LastModified
+        реплики, а не от поколений в общем кэше."""
+        address = reverse('posts:index')
+        primary_etag = self.client.get(address)['ETag']
+        with mock.patch.object(
+            replicas, 'read_alias', return_value='replica1'
+        ):
+            etag = self.client.get(address)['ETag']
+            self.assertNotEqual(etag, primary_etag)
+            # Поколение в кэше уже новое, а реплика ещё не догнала.
+            feed_cache.bump(feed_cache.POSTS)
+            response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+            LastModified.objects.touch(feed_cache.POSTS)
+            response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified_skips_view(self):
+        """Повторный запрос с тем же ETag получает 304 без отрисовки."""
+        for address in ConditionalGetTest.addresses:
+            with self.subTest(address=address):
+                with mock.patch(
+                    'posts.views.render', wraps=render
+                ) as rendered:
+                    response = self.revalidate(address)
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.NOT_MODIFIED
+                    )
+                    self.assertEqual(rendered.call_count, 1)
+
+    def test_changes_invalidate_etag(self):
+        """Новый пост, комментарий или другой пользователь — новый ETag."""
+        etags = {
+            address: self.client.get(address)['ETag']
+            for address in ConditionalGetTest.addresses
+        }
+        Post.objects.create(
+            text='new_post', author=self.author, group=self.group
+        )
+        Comment.objects.create(
+            post=self.post, author=self.author, text='comment'
+        )
+        for address, etag in etags.items():
+            with self.subTest(address=address):
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.client.force_login(self.author)
+                response = self.client.get(
+                    address, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.client.logout()
+
+    def test_edit_and_delete_update_last_modified(self):
+        """Правка и удаление поста сдвигают время изменения его лент."""
+        post = Post.objects.create(
+            text='edited', author=self.author, group=self.group
+        )
+        scopes = ('posts', f'group:{self.group.pk}',
+                  f'author:{self.author.pk}')
+        created = LastModified.objects.latest_for(*scopes)
+        self.assertEqual(created, post.updated_at)
+        post.text = 'edited again'
+        post.save()
+        self.assertGreater(post.updated_at, post.pub_date)
+        for scope in scopes:
+            with self.subTest(scope=scope):
+                self.assertEqual(
+                    LastModified.objects.latest_for(scope), post.updated_at
+                )
+        post.delete()
+        self.assertGreater(
+            LastModified.objects.latest_for(*scopes), post.updated_at
+        )
+
+    def test_rebuild_last_modified(self):
+        LastModified.objects.all().delete()
+        call_command('rebuild_last_modified', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(
+            LastModified.objects.latest_for(f'group:{self.group.pk}'),
+            self.post.updated_at,
+        )
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        self.assertTrue(response.has_header('Last-Modified'))
+
+
 class ViewTestClass(TestCase):
     def test_page_not_found(self):
         response = self.client.get('/nonexist-page/')
@@ -0,0 +1,178 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Миниатюры создаются пулом потоков после сохранения картинки, а не
+при первом показе страницы. Пока миниатюры нет, шаблон показывает
+исходную картинку (см. templatetags/post_images.py).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+
+from . import feed_cache
+from .models import LastModified, Post
+
+logger = logging.getLogger(__name__)
+
+# Название -> (геометрия, опции sorl-thumbnail).
+RENDITIONS = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# Ширины для srcset: браузер выбирает миниатюру по ширине экрана.
+# Если Pillow умеет WebP, они сжимаются в WebP, а 'feed' в JPEG
+# остаётся для браузеров без WebP.
+SRCSET_WIDTHS = (480, 720, 960, 1440)
+SRCSET_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+
+
+def _srcset_renditions(rendition):
+    geometry, _ = RENDITIONS[rendition]
+    width, height = map(int, geometry.split('x'))
+    return {
+        f'{rendition}-{srcset_width}': (
+            f'{srcset_width}x{round(srcset_width * height / width)}',
+            {'crop': 'center', 'upscale': False,
+             'format': SRCSET_FORMAT, 'quality': 80},
+        )
+        for srcset_width in SRCSET_WIDTHS
+    }
+
+
+# Название -> миниатюры для его srcset.
+SRCSETS = {'feed': _srcset_renditions('feed')}
+for _renditions in SRCSETS.values():
+    RENDITIONS.update(_renditions)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class LookupBackend(ThumbnailBackend):
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """Как get_thumbnail, но только ищет готовую миниатюру."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+lookup_backend = LookupBackend()
+
+
+def cached(image, rendition):
+    """Готовая миниатюра картинки или None."""
+    geometry, options = RENDITIONS[rendition]
+    return lookup_backend.get_cached_thumbnail(image, geometry, **options)
+
+
+def _refresh_feeds(name):
+    """Сбрасывает кэш лент, где картинка показывалась без миниатюры."""
+    posts = Post.objects.filter(image=name).values_list(
+        'author_id', 'group_id'
+    )
+    scopes = [feed_cache.POSTS]
+    for author_id, group_id in posts:
+        scopes.append(feed_cache.author_scope(author_id))
+        if group_id:
+            scopes.append(feed_cache.group_scope(group_id))
+    feed_cache.bump(*scopes)
+    # Для страниц с реплик поколение — время из LastModified.
+    LastModified.objects.touch(*scopes)
+
+
+def generate(name):
+    """Создаёт недостающие миниатюры картинки name.
+
+    Возвращает число созданных миниатюр.
+    """
+    try:
+        # Хранилище поля, а не default.storage: от класса хранилища
+        # зависит ключ картинки в kvstore, по которому ищет cached().
+        image = ImageFile(name, Post.image.field.storage)
+        if not image.exists():
+            return 0
+        missing = [
+            rendition for rendition in RENDITIONS
+            if cached(image, rendition) is None
+        ]
+        for rendition in missing:
+            geometry, options = RENDITIONS[rendition]
+            get_thumbnail(image, geometry, **options)
+        if missing:
+            _refresh_feeds(name)
+        return len(missing)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return 0
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def _generate_in_worker(name):
+    try:
+        return generate(name)
+    finally:
+        connections.close_all()
+
+
+def _use_workers():
+    # SQLite в памяти (тестовая база) блокирует таблицы целиком, и
+    # запись из потока пула мешает основному потоку.
+    return settings.THUMBNAIL_WORKERS and not (
+        connection.vendor == 'sqlite' and connection.is_in_memory_db()
+    )
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def schedule(name):
+    """Ставит картинку в очередь на генерацию миниатюр.
+
+    Повторные вызовы для картинки, которая уже в очереди, ничего не
+    делают. При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу.
+    """
+    if not name:
+        return None
+    with _lock:
+        if name in _pending:
+            return None
+        _pending.add(name)
+    # Считается постановка в очередь: миниатюры создаются в потоке
+    # пула, вне контекста метрик запроса и часто уже после ответа.
+    metrics.incr('thumbnails')
+    if not _use_workers():
+        return generate(name)
+    return _get_executor().submit(_generate_in_worker, name)
+
+
+def schedule_on_commit(name):
+    transaction.on_commit(lambda: schedule(name))
@@ -0,0 +1,126 @@
+"""Лента подписок, материализованная при записи (fan-out on write).
+
+Новый пост раскладывается в TimelineEntry каждого подписчика автора.
+Для авторов, у которых подписчиков больше TIMELINE_FANOUT_LIMIT, посты
+не раскладываются, а подмешиваются в ленту при чтении.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .bulk import BATCH_SIZE, batches
+from .models import Follow, Post, TimelineEntry, User, UserStats
+
+
+def is_fanout_author(author_id):
+    followers_count = UserStats.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+    return followers_count <= settings.TIMELINE_FANOUT_LIMIT
+
+
+def _entries(user_ids, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in user_ids
+        for post in posts
+    ]
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_fanout_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        _entries(followers.iterator(), [post]),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def reassign(post):
+    """Переносит пост, сменивший автора, в ленты подписчиков нового
+    автора."""
+    TimelineEntry.objects.filter(post_id=post.pk).delete()
+    fan_out(post)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if not is_fanout_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_many(user_id, author_ids):
+    """Как backfill для нескольких авторов: одна вставка на всех."""
+    pulled = set(UserStats.objects.filter(
+        pk__in=author_ids,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('pk', flat=True))
+    posts = []
+    # Срез на автора: LIMIT внутри UNION SQLite не поддерживает.
+    for author_id in set(author_ids) - pulled:
+        posts.extend(Post.objects.filter(author_id=author_id).only(
+            'pk', 'author_id', 'pub_date'
+        )[:settings.TIMELINE_BACKFILL])
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def pulled_authors(user):
+    """Авторы из подписок, чьи посты подмешиваются при чтении."""
+    return Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True)
+
+
+def hybrid_posts(user):
+    """Лента подписок одним запросом к постам: разложенные посты
+    плюс посты авторов, для которых раскладка не делается."""
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=pulled_authors(user))
+    )
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты заново по текущим подпискам. Пользователи
+    обрабатываются пачками, каждая пачка — в своей транзакции."""
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator()
+    for batch in batches(user_ids, BATCH_SIZE):
+        authors = defaultdict(list)
+        follows = Follow.objects.filter(user_id__in=batch).values_list(
+            'user_id', 'author_id'
+        )
+        for user_id, author_id in follows.iterator():
+            authors[user_id].append(author_id)
+        with transaction.atomic():
+            TimelineEntry.objects.filter(user_id__in=batch).delete()
+            for user_id, author_ids in authors.items():
+                backfill_many(user_id, author_ids)
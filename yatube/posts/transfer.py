@@ -0,0 +1,290 @@
+"""Перенос контента между окружениями в формате JSON Lines.
+
+Выгрузка — каталог с файлом на модель (users.jsonl, groups.jsonl,
+posts.jsonl, comments.jsonl, follows.jsonl) и картинками постов в
+media/. Строки пишутся и читаются потоком, пачками по BATCH_SIZE, так
+что память не зависит от объёма данных: ссылки на пользователей и
+группы разрешаются запросом на пачку, а не словарём на всю базу.
+
+Пользователи и группы сопоставляются по username и slug (пароли не
+переносятся), посты — по автору и дате публикации, комментарии — по
+посту, автору и дате, поэтому повторная загрузка того же каталога
+ничего не дублирует. Новые посты и комментарии сохраняют свои id; если
+id в базе занят другой строкой, строка получает новый id, а замена
+запоминается (в памяти держатся только такие замены), чтобы
+комментарии попали к своему посту. bulk_create обходит сигналы: после
+загрузки производные данные нужно пересобрать (это делает
+manage.py import_posts).
+"""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.utils._os import safe_join
+from django.utils.dateparse import parse_datetime
+
+from .bulk import BATCH_SIZE, batches
+from .models import Comment, Follow, Group, Post, User
+
+MEDIA_DIR = 'media'
+
+# Файл выгрузки -> (модель, поле в файле -> поле в values_list).
+# Порядок — порядок загрузки: сначала то, на что ссылаются.
+EXPORTS = {
+    'users': (User, {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'email': 'email',
+    }),
+    'groups': (Group, {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }),
+    'posts': (Post, {
+        'id': 'pk',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'image': 'image',
+        'image_width': 'image_width',
+        'image_height': 'image_height',
+        'pub_date': 'pub_date',
+        'updated_at': 'updated_at',
+    }),
+    'comments': (Comment, {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+def _path(directory, name):
+    return os.path.join(directory, f'{name}.jsonl')
+
+
+def _copy_image(name, directory):
+    target = safe_join(directory, MEDIA_DIR, name)
+    if os.path.exists(target) or not default_storage.exists(name):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with default_storage.open(name) as source, open(target, 'wb') as copy:
+        shutil.copyfileobj(source, copy)
+
+
+def export_model(name, directory):
+    """Выгружает модель в <directory>/<name>.jsonl, возвращает число строк."""
+    model, fields = EXPORTS[name]
+    rows = model.objects.order_by('pk').values_list(
+        *fields.values()
+    ).iterator(chunk_size=BATCH_SIZE)
+    count = 0
+    with open(_path(directory, name), 'w', encoding='utf-8') as output:
+        for values in rows:
+            row = dict(zip(fields, values))
+            # Не DjangoJSONEncoder: он округляет время до миллисекунд.
+            output.write(json.dumps(
+                row, default=datetime.isoformat, ensure_ascii=False
+            ))
+            output.write('\n')
+            if row.get('image'):
+                _copy_image(row['image'], directory)
+            count += 1
+    return count
+
+
+@contextmanager
+def keep_dates(model):
+    """Отключает auto_now и auto_now_add, чтобы bulk_create сохранил
+    даты из выгрузки."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _ids(model, field, values):
+    values = set(values) - {None}
+    return dict(
+        model.objects.filter(**{f'{field}__in': values}).values_list(
+            field, 'pk'
+        )
+    )
+
+
+def _restore_image(name, directory):
+    """Имя картинки в хранилище: такая же картинка, уже сохранённая
+    под другим именем, не копируется (см. storage.py)."""
+    storage = Post.image.field.storage
+    source = safe_join(directory, MEDIA_DIR, name)
+    if storage.exists(name) or not os.path.exists(source):
+        return name
+    with open(source, 'rb') as image:
+        return storage.save(name, File(image))
+
+
+def _users(batch, directory, remapped):
+    return [
+        User(password=make_password(None), **row) for row in batch
+    ]
+
+
+def _groups(batch, directory, remapped):
+    return [Group(**row) for row in batch]
+
+
+def _place(model, objects, key_fields, remapped):
+    """Оставляет из objects только строки, которых ещё нет в базе (по
+    полям key_fields), а занятые другими строками id меняет на
+    свободные. В remapped пишется старый id -> id строки в базе, если
+    они различаются."""
+    if not objects:
+        return objects
+    found = {
+        tuple(row[:-1]): row[-1]
+        for row in model.objects.filter(**{
+            f'{field}__in': {getattr(obj, field) for obj in objects}
+            for field in key_fields
+        }).values_list(*key_fields, 'pk')
+    }
+    ids = [obj.pk for obj in objects]
+    taken = set(
+        model.objects.filter(pk__in=ids).values_list('pk', flat=True)
+    )
+    next_id = None
+    placed = []
+    for obj in objects:
+        old_id = obj.pk
+        key = tuple(getattr(obj, field) for field in key_fields)
+        if key in found:
+            # Строка уже загружена.
+            if found[key] != old_id:
+                remapped[old_id] = found[key]
+            continue
+        if old_id in taken:
+            if next_id is None:
+                stored = model.objects.aggregate(top=Max('pk'))['top']
+                next_id = max(stored, *ids) + 1
+            obj.pk = next_id
+            next_id += 1
+            remapped[old_id] = obj.pk
+        placed.append(obj)
+    return placed
+
+
+def _posts(batch, directory, remapped):
+    authors = _ids(User, 'username', (row['author'] for row in batch))
+    groups = _ids(Group, 'slug', (row['group'] for row in batch))
+    posts = _place(Post, [
+        Post(
+            pk=row['id'],
+            author_id=authors[row['author']],
+            group_id=groups.get(row['group']),
+            text=row['text'],
+            image=row['image'],
+            # В ранних выгрузках размеров картинки нет.
+            image_width=row.get('image_width'),
+            image_height=row.get('image_height'),
+            pub_date=parse_datetime(row['pub_date']),
+            updated_at=parse_datetime(row['updated_at']),
+        )
+        for row in batch
+    ], ('author_id', 'pub_date'), remapped['posts'])
+    for post in posts:
+        if post.image:
+            post.image = _restore_image(post.image.name, directory)
+    return posts
+
+
+def _comments(batch, directory, remapped):
+    authors = _ids(User, 'username', (row['author'] for row in batch))
+    post_ids = remapped['posts']
+    comments = [
+        Comment(
+            pk=row['id'],
+            post_id=post_ids.get(row['post'], row['post']),
+            author_id=authors[row['author']],
+            text=row['text'],
+            created=parse_datetime(row['created']),
+        )
+        for row in batch
+    ]
+    # Комментарии к постам, которых нет ни в выгрузке, ни в базе,
+    # пропускаются.
+    posts = _ids(Post, 'pk', (comment.post_id for comment in comments))
+    return _place(
+        Comment,
+        [comment for comment in comments if comment.post_id in posts],
+        ('post_id', 'author_id', 'created'),
+        remapped['comments'],
+    )
+
+
+def _follows(batch, directory, remapped):
+    users = _ids(
+        User, 'username',
+        (username for row in batch for username in row.values())
+    )
+    return [
+        Follow(user_id=users[row['user']], author_id=users[row['author']])
+        for row in batch
+    ]
+
+
+BUILDERS = {
+    'users': _users,
+    'groups': _groups,
+    'posts': _posts,
+    'comments': _comments,
+    'follows': _follows,
+}
+
+
+def new_remapped():
+    """Замены id постов и комментариев на время одной загрузки."""
+    return {'posts': {}, 'comments': {}}
+
+
+def import_model(name, directory, remapped):
+    """Загружает <directory>/<name>.jsonl, возвращает число прочитанных
+    строк. Строки, которые уже есть в базе, пропускаются; remapped —
+    общий для всей загрузки словарь из new_remapped()."""
+    model, _ = EXPORTS[name]
+    build = BUILDERS[name]
+    path = _path(directory, name)
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    with open(path, encoding='utf-8') as source, keep_dates(model):
+        for lines in batches(source, BATCH_SIZE):
+            batch = [json.loads(line) for line in lines]
+            model.objects.bulk_create(
+                build(batch, directory, remapped),
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            count += len(batch)
+    return count
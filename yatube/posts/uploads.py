@@ -0,0 +1,120 @@
+"""Обработка загруженных картинок постов.
+
+Загрузки больше FILE_UPLOAD_MAX_MEMORY_SIZE Django пишет во временный
+файл по частям, поэтому в память целиком они не попадают. Перед
+сохранением картинка:
+
+- отклоняется, если файл больше IMAGE_MAX_UPLOAD_SIZE или в ней больше
+  IMAGE_MAX_PIXELS точек (это видно по заголовку, без декодирования);
+- поворачивается по EXIF и уменьшается до IMAGE_MAX_SIDE по большей
+  стороне (JPEG сразу декодируется в уменьшенном масштабе);
+- пересжимается без метаданных (EXIF, комментарии; цветовой профиль
+  остаётся) в тот же формат, если это JPEG, PNG, GIF или WebP, а иначе —
+  в JPEG или, при прозрачности, в PNG.
+
+Размеры результата сохраняются в Post.image_width/image_height, чтобы
+шаблонам не нужно было открывать файл.
+"""
+import math
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+JPEG_QUALITY = 85
+# Формат -> расширение; в этих форматах картинка пересохраняется как
+# была, остальные переводятся в JPEG или PNG.
+KEPT_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': JPEG_QUALITY},
+    'GIF': {},
+}
+# Что из image.info нужно для отображения; остальное (exif, xmp,
+# комментарии) — метаданные, которые не сохраняются.
+KEPT_INFO = ('transparency', 'duration', 'loop', 'background')
+
+
+def _check_limits(upload, image):
+    if upload.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            params={'limit': filesizeformat(settings.IMAGE_MAX_UPLOAD_SIZE)},
+            code='file_too_large',
+        )
+    if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            params={'limit': settings.IMAGE_MAX_PIXELS // 10 ** 6},
+            code='too_many_pixels',
+        )
+    if (getattr(image, 'is_animated', False)
+            and max(image.size) > settings.IMAGE_MAX_SIDE):
+        raise ValidationError(
+            'Анимированная картинка больше %(limit)s точек по стороне.',
+            params={'limit': settings.IMAGE_MAX_SIDE},
+            code='animation_too_large',
+        )
+
+
+def _output_format(image):
+    if image.format in KEPT_FORMATS:
+        return image.format
+    transparent = (
+        image.mode in ('RGBA', 'LA')
+        or (image.mode == 'P' and 'transparency' in image.info)
+    )
+    return 'PNG' if transparent else 'JPEG'
+
+
+def _downsample(image):
+    max_side = settings.IMAGE_MAX_SIDE
+    scale = max(image.size) / max_side
+    if scale > 1 and image.format == 'JPEG':
+        # libjpeg декодирует сразу в 1/2, 1/4 или 1/8 размера.
+        image.draft('RGB', (
+            math.ceil(image.width / scale), math.ceil(image.height / scale)
+        ))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def process(upload):
+    """Картинка, готовая к сохранению: ContentFile с атрибутами
+    width и height."""
+    upload.seek(0)
+    with Image.open(upload) as image:
+        _check_limits(upload, image)
+        output_format = _output_format(image)
+        options = dict(SAVE_OPTIONS[output_format])
+        icc_profile = image.info.get('icc_profile')
+        if icc_profile and output_format != 'GIF':
+            options['icc_profile'] = icc_profile
+        if getattr(image, 'is_animated', False):
+            # Кадры не уменьшаются (размер проверен выше), только
+            # пересохраняются без метаданных.
+            options['save_all'] = True
+            result = image
+        else:
+            result = _downsample(image)
+        if output_format == 'JPEG' and result.mode not in ('RGB', 'L'):
+            result = result.convert('RGB')
+        # PNG и GIF берут часть метаданных из info, а не из параметров.
+        result.info = {
+            key: result.info[key] for key in KEPT_INFO if key in result.info
+        }
+        content = BytesIO()
+        result.save(content, output_format, **options)
+        width, height = result.size
+    name, extension = os.path.splitext(os.path.basename(upload.name))
+    if image.format not in KEPT_FORMATS:
+        extension = f'.{KEPT_FORMATS[output_format]}'
+    processed = ContentFile(content.getvalue(), name=f'{name}{extension}')
+    processed.width, processed.height = width, height
+    return processed
@@ -1,9 +1,11 @@
-from django.urls import path
+from django.urls import path, register_converter
 
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
+register_converter(feeds.FormatConverter, 'feed_format')
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
@@ -11,17 +13,46 @@ urlpatterns = [
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('create/', views.post_create, name='post_create'),
+    path('search/', views.search_posts, name='search'),
+    path('feed.<feed_format:fmt>', views.index_feed, name='index_feed'),
+    path(
+        'group/<slug:slug>/feed.<feed_format:fmt>',
+        views.group_feed,
+        name='group_feed'
+    ),
+    path(
+        'profile/<str:username>/feed.<feed_format:fmt>',
+        views.profile_feed,
+        name='profile_feed'
+    ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/many/', views.follow_many, name='follow_many'),
+    path('unfollow/many/', views.unfollow_many, name='unfollow_many'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
         name='profile_follow'
     ),
+    path(
+        'profile/<str:username>/followers/',
+        views.followers,
+        name='followers'
+    ),
+    path(
+        'profile/<str:username>/following/',
+        views.following,
+        name='following'
+    ),
     path(
         'profile/<str:username>/unfollow/',
         views.profile_unfollow,
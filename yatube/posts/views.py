@@ -1,73 +1,177 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 
-from posts.forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from core import replicas
+from posts.forms import CommentForm, FollowManyForm, PostForm, SearchForm
+from . import (
+    conditional, feed_cache, feeds, follows, search, thumbnails, timeline
+)
+from .models import Follow, Group, Post, User, UserStats
+from .paginators import CursorPaginator, InvalidCursor, elide_pages
 
+FEED_ORDERING = ('-pub_date', '-pk')
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+# Новые подписки сначала: индексы (author, -id) и (user, -id).
+FOLLOW_ORDERING = ('-pk',)
 
-def paginate(record_set, request):
+# Страницы зависят от пользователя и проверяются по ETag: без явного
+# no-cache браузер сам решил бы, сколько показывать их без запроса.
+revalidate_always = cache_control(private=True, no_cache=True)
+
+
+def paginate(record_set, request, count=None, ordering=FEED_ORDERING):
+    cursor = request.GET.get('cursor')
+    if cursor is not None or settings.FEED_PAGINATION == 'cursor':
+        paginator = CursorPaginator(
+            record_set, settings.ITEMS_COUNT, ordering=ordering
+        )
+        return paginator.get_page(cursor)
+    return paginate_pages(record_set, request, count)
+
+
+def paginate_pages(record_set, request, count=None):
+    """Постраничный вывод по номерам страниц."""
     paginator = Paginator(record_set, settings.ITEMS_COUNT)
+    if count is not None:
+        # Число записей уже известно: Paginator не будет делать COUNT(*).
+        paginator.count = count
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    return elide_pages(paginator.get_page(page_number))
+
+
+def paginate_comments(post, request):
+    comments = post.comments.select_related('author').only(
+        'text', 'created', 'post_id', 'author__username'
+    )
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_COUNT, ordering=('created', 'pk')
+    )
+    return paginator.get_page(request.GET.get('cursor'))
 
 
+@revalidate_always
+@condition(etag_func=conditional.index_etag,
+           last_modified_func=conditional.index_last_modified)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     context = {
         'page_obj': paginate(post_list, request),
+        **feed_cache.page_context(
+            request, feed_cache.POSTS, feed_cache.GROUPS
+        ),
     }
     return render(request, 'posts/index.html', context)
 
 
+@revalidate_always
+@condition(etag_func=conditional.group_etag,
+           last_modified_func=conditional.group_last_modified)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.for_feed()
     context = {
         'page_obj': paginate(posts, request),
         'group': group,
-        'posts': posts,
+        **feed_cache.page_context(
+            request, feed_cache.group_scope(group.pk), feed_cache.GROUPS
+        ),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@revalidate_always
+@condition(etag_func=conditional.profile_etag,
+           last_modified_func=conditional.profile_last_modified)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts = author.posts.for_feed()
+    stats = UserStats.for_user(author)
+    post_count = stats.posts_count
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=author).exists()
     context = {
-        'page_obj': paginate(posts, request),
-        'post_count': posts.count(),
+        'page_obj': paginate(posts, request, count=post_count),
+        'post_count': post_count,
+        'stats': stats,
         'author': author,
         'following': following,
+        **feed_cache.page_context(
+            request, feed_cache.author_scope(author.pk), feed_cache.GROUPS
+        ),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search_posts(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        posts = Post.objects.for_feed()
+        if form.cleaned_data['group']:
+            posts = posts.filter(group=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            posts = posts.filter(
+                author__username=form.cleaned_data['author']
+            )
+        # Порядок по релевантности: курсор по дате здесь не подходит.
+        page_obj = paginate_pages(
+            search.search(posts, form.cleaned_data['q']), request
+        )
+    query = request.GET.copy()
+    query.pop('page', None)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'page_query': query.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@revalidate_always
+@condition(etag_func=conditional.post_etag,
+           last_modified_func=conditional.post_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     author = post.author
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = paginate_comments(post, request)
     context = {
         'author': author,
         'post': post,
-        'post_count': post.author.posts.count(),
+        'post_count': UserStats.posts_count_for(author),
         'form': form,
         'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': paginate_comments(post, request),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule_on_commit(post.image.name)
         return redirect('posts:profile', username=request.user.username)
 
     posts_group = Group.objects.all()
@@ -93,6 +197,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule_on_commit(post.image.name)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -113,10 +219,26 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def paginate_timeline(user, request):
+    if timeline.pulled_authors(user).exists():
+        return paginate(timeline.hybrid_posts(user).for_feed(), request)
+    page_obj = paginate(
+        user.timeline.only('user', 'post', 'pub_date'), request,
+        ordering=TIMELINE_ORDERING,
+    )
+    entries = list(page_obj.object_list)
+    posts = Post.objects.for_feed().in_bulk(
+        [entry.post_id for entry in entries]
+    )
+    page_obj.object_list = [
+        posts[entry.post_id] for entry in entries if entry.post_id in posts
+    ]
+    return page_obj
+
+
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    context = {'page_obj': paginate(post_list, request)}
+    context = {'page_obj': paginate_timeline(request.user, request)}
     return render(request, 'posts/follow.html', context)
 
 
@@ -124,12 +246,134 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        replicas.pin_to_primary(request)
+        follows.follow(request.user, author)
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    replicas.pin_to_primary(request)
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username)
+
+
+def change_follows(request, change):
+    form = FollowManyForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    change(request.user, [author.pk for author in form.cleaned_data[
+        'authors'
+    ]])
+    return redirect('posts:follow_index')
+
+
+@login_required
+@require_POST
+def follow_many(request):
+    """Подписка на несколько авторов: authors — их username."""
+    return change_follows(request, follows.follow_many)
+
+
+@login_required
+@require_POST
+def unfollow_many(request):
+    return change_follows(request, follows.unfollow_many)
+
+
+def follow_list(request, username, owner_field, member_field, title):
+    """Подписчики или подписки пользователя: поле Follow с владельцем
+    списка и поле с пользователями списка."""
+    owner = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    follow_rows = Follow.objects.filter(
+        **{owner_field: owner}
+    ).select_related(
+        member_field
+    ).only(
+        member_field, f'{member_field}__username',
+        f'{member_field}__first_name', f'{member_field}__last_name',
+    )
+    paginator = CursorPaginator(
+        follow_rows, settings.FOLLOWS_COUNT, ordering=FOLLOW_ORDERING
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    page_obj.object_list = [
+        getattr(follow, member_field) for follow in page_obj.object_list
+    ]
+    context = {
+        'author': owner,
+        'stats': UserStats.for_user(owner),
+        'page_obj': page_obj,
+        'title': title,
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+@revalidate_always
+@condition(etag_func=conditional.follows_etag,
+           last_modified_func=conditional.follows_last_modified)
+def followers(request, username):
+    return follow_list(request, username, 'author', 'user', 'Подписчики')
+
+
+@revalidate_always
+@condition(etag_func=conditional.follows_etag,
+           last_modified_func=conditional.follows_last_modified)
+def following(request, username):
+    return follow_list(request, username, 'user', 'author', 'Подписки')
+
+
+def stream_feed(request, fmt, posts, title, link):
+    """Страница ленты для агрегаторов, всегда с курсором."""
+    paginator = CursorPaginator(
+        feeds.project(posts), settings.FEEDS_ITEMS_COUNT,
+        ordering=FEED_ORDERING,
+    )
+    try:
+        page_obj = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Неверный курсор')
+    return feeds.response(request, fmt, page_obj, title, link)
+
+
+# Ленты не зависят от пользователя: их можно хранить в общих кэшах.
+feed_cache_control = cache_control(
+    public=True, max_age=settings.FEEDS_MAX_AGE
+)
+
+
+@feed_cache_control
+@condition(etag_func=conditional.index_feed_etag,
+           last_modified_func=conditional.index_feed_last_modified)
+def index_feed(request, fmt):
+    return stream_feed(
+        request, fmt, Post.objects.all(),
+        'Последние обновления на сайте', reverse('posts:index'),
+    )
+
+
+@feed_cache_control
+@condition(etag_func=conditional.group_feed_etag,
+           last_modified_func=conditional.group_feed_last_modified)
+def group_feed(request, slug, fmt):
+    group = get_object_or_404(Group.objects.only('title'), slug=slug)
+    return stream_feed(
+        request, fmt, group.posts.all(),
+        f'Записи сообщества "{group.title}"',
+        reverse('posts:group_list', args=[slug]),
+    )
+
+
+@feed_cache_control
+@condition(etag_func=conditional.profile_feed_etag,
+           last_modified_func=conditional.profile_feed_last_modified)
+def profile_feed(request, username, fmt):
+    author = get_object_or_404(User, username=username)
+    return stream_feed(
+        request, fmt, author.posts.all(),
+        f'Профайл пользователя {author.get_full_name() or username}',
+        reverse('posts:profile', args=[username]),
+    )
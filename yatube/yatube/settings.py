@@ -1,4 +1,9 @@
 import os
+import sys
+
+from core.cache import REDIS_KVSTORE, cache_config, thumbnail_kvstore
+from core.replicas import replica_databases
+from core.sqlite import sqlite_profile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -33,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,7 +54,7 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -72,6 +79,20 @@ DATABASES = {
     }
 }
 
+# Профиль SQLite (см. core/sqlite.py): development или production.
+DB_PROFILE = os.environ.get('YATUBE_DB_PROFILE', 'development')
+DB_PROFILE_SETTINGS, SQLITE_PRAGMAS = sqlite_profile(DB_PROFILE)
+DATABASES['default'].update(DB_PROFILE_SETTINGS)
+
+# Реплики для чтения (см. core/replicas.py): имена баз через запятую.
+DATABASES.update(replica_databases(
+    os.environ.get('YATUBE_DB_REPLICAS', ''), DATABASES['default']
+))
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы.
+REPLICA_PIN_SECONDS = 10
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,6 +122,33 @@ USE_TZ = True
 
 ITEMS_COUNT = 10
 
+# 'offset' — номера страниц, 'cursor' — постраничный вывод по ключу
+# (pub_date, id) без COUNT(*) и OFFSET.
+FEED_PAGINATION = 'offset'
+
+COMMENTS_COUNT = 20
+
+# Подписчиков и подписок на странице списка.
+FOLLOWS_COUNT = 50
+# Сколько авторов можно подписать или отписать одним запросом.
+FOLLOWS_BATCH_LIMIT = 100
+# Рекомендаций подписок: хранится на пользователя и показывается.
+SUGGESTIONS_COUNT = 20
+SUGGESTIONS_SHOWN = 5
+
+# Ленты JSON/RSS/Atom: записей на странице и сколько секунд их можно
+# держать в кэшах клиентов и прокси.
+FEEDS_ITEMS_COUNT = 50
+FEEDS_MAX_AGE = 5 * 60
+
+# Лента подписок: посты авторов, у которых подписчиков не больше
+# TIMELINE_FANOUT_LIMIT, раскладываются по лентам при публикации; посты
+# остальных подмешиваются при чтении. При подписке в ленту добавляются
+# последние TIMELINE_BACKFILL постов автора.
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BACKFILL = 1000
+TIMELINE_BATCH_SIZE = 500
+
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
@@ -117,10 +165,63 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки больше этого размера пишутся во временный файл по частям.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+# Картинки постов (см. posts/uploads.py): предельный размер файла и
+# число точек, а большая сторона уменьшается до IMAGE_MAX_SIDE.
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50 * 10 ** 6
+IMAGE_MAX_SIDE = 2048
+
+# Страницы лент сбрасываются сигналами сразу после изменений,
+# TTL ограничивает только размер кэша.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# manage.py test или pytest.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+# Кэш общий для всех воркеров: Redis или файловый (см. core/cache.py).
+# Тесты без YATUBE_CACHE_URL получают свой кэш в памяти, а не файловый
+# кэш сервера разработки: иначе данные переходили бы между запусками, а
+# cache.clear() в тестах стирал бы кэш разработчика.
+CACHE_URL = os.environ.get(
+    'YATUBE_CACHE_URL', 'locmem://' if TESTING else ''
+)
+
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': cache_config(CACHE_URL, os.path.join(BASE_DIR, 'cache')),
+}
+
+# Потоки для фоновой генерации миниатюр; 0 — генерировать сразу.
+THUMBNAIL_WORKERS = 2
+
+THUMBNAIL_KVSTORE = thumbnail_kvstore(CACHE_URL)
+THUMBNAIL_CACHE = 'default'
+if THUMBNAIL_KVSTORE == REDIS_KVSTORE:
+    THUMBNAIL_REDIS_URL = CACHE_URL
+
+# Метрики запросов (core/metrics.py): заголовок Server-Timing и
+# период сброса гистограмм в общий кэш, в секундах.
+METRICS_SERVER_TIMING = True
+METRICS_FLUSH_INTERVAL = 10
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            # Строка на каждый запрос; в manage.py test она не нужна.
+            'level': os.environ.get(
+                'YATUBE_METRICS_LOG_LEVEL',
+                'WARNING' if TESTING else 'INFO',
+            ),
+            'propagate': False,
+        },
+    },
 }
 
 INTERNAL_IPS = [